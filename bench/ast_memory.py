@@ -0,0 +1,63 @@
+# Reports the memory a parsed AST keeps, as tracemalloc sees it, for a
+# generated main() of STATEMENTS statements (assignments, prints, ifs and
+# calls). It's measured twice: with the per-kind __slots__ node classes, and
+# with every node built as the dict-backed fallback, which is how all nodes
+# were stored before.
+#
+#   python bench/ast_memory.py [statements]
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import brewparse
+import element
+
+STATEMENTS = 50000
+
+
+def program(statements):
+    lines = ["func main() {"]
+    for i in range(0, statements, 4):
+        lines.append(f"  x{i} = {i} + y * 2;")
+        lines.append(f'  print("v", x{i + 1});')
+        lines.append(f"  if (x{i + 2} > 3) {{ z = z - 1; }}")
+        lines.append(f"  foo({i + 3}, bar);")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+# Bytes still held once source is parsed, and how long parsing took
+def retained(source):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    ast = brewparse.parse_program(source)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del ast
+    return held, elapsed
+
+
+def main(statements=STATEMENTS):
+    source = program(statements)
+    brewparse.parse_program("func main() { x = 1; }")  # loads the tables
+    slotted, slotted_time = retained(source)
+    with mock.patch.dict(element._NODE_CLASSES, clear=True):
+        with_dicts, dicts_time = retained(source)
+    print(f"{statements} statements, bytes held by the AST (parse time under")
+    print("tracemalloc):")
+    print(f"  dict-backed nodes  {with_dicts / 1e6:7.2f} MB  ({dicts_time:.2f} s)")
+    print(f"  __slots__ nodes    {slotted / 1e6:7.2f} MB  ({slotted_time:.2f} s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:])))
@@ -0,0 +1,62 @@
+# Times a loop that calls a two-argument function 10^3, 10^4 and 10^5 times
+# on every engine. A call's bindings live in its own frame and go with it,
+# so the time per call should stay flat as the loop gets longer; bindings
+# that outlived their call would make it grow with the number of calls made.
+# Exits with status 1 if it grows more than SLOWDOWN times on any engine.
+#
+#   python bench/call_scaling.py
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+warnings.simplefilter("ignore", SyntaxWarning)
+
+from interpreterv2 import Interpreter
+
+SLOWDOWN = 3
+CALLS = (10**3, 10**4, 10**5)
+PROGRAM = """
+func f(a, b) {
+  c = a + b;
+  return c - b;
+}
+
+func main() {
+  i = 0;
+  while (i < %d) {
+    i = f(i, 2) + 1;
+  }
+  print(i);
+}
+"""
+
+
+def per_call(engine, calls):
+    program = PROGRAM % calls
+    interpreter = Interpreter(console_output=False, engine=engine)
+    interpreter.run(program)  # parses and prepares the program
+    start = time.perf_counter()
+    interpreter.run(program)
+    elapsed = time.perf_counter() - start
+    assert interpreter.get_output()[-1] == str(calls)
+    return elapsed / calls
+
+
+def main():
+    failures = 0
+    print(f"{'us/call':8s}" + "".join(f"{calls:>10d}" for calls in CALLS))
+    for engine in Interpreter.ENGINES:
+        times = [per_call(engine, calls) for calls in CALLS]
+        growth = times[-1] / times[0]
+        cost = "".join(f"{t * 1e6:10.2f}" for t in times)
+        print(f"{engine:8s}{cost}   x{growth:.1f}")
+        if growth > SLOWDOWN:
+            failures += 1
+    print(f"{failures} engines grew faster than linear")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+# Runs each program below on every engine and checks that they all print the
+# same output and fail (if they do) with the same error and line. Exits with
+# status 1 if any engine disagrees. Calls may go MAX_CALL_DEPTH deep, so
+# errors far down the stack are covered too.
+#
+#   python bench/check_engines.py
+import os
+import sys
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+warnings.simplefilter("ignore", SyntaxWarning)
+
+from interpreterv2 import Interpreter
+
+MAX_CALL_DEPTH = 10000
+
+PROGRAMS = {
+    # constant folding drops every statement of the block
+    "folded main": "func main() { if (false) { print(1); } }",
+    "folded then": """
+func main() {
+  x = 1;
+  if (x == 1) { if (false) { print(1); } }
+  print("done");
+}""",
+    "folded else": """
+func main() {
+  x = 2;
+  if (x == 1) { print(1); } else { if (false) { print(2); } }
+  while (x < 4) { if (false) { print(3); } x = x + 1; }
+  print(x);
+}""",
+    "folded function": """
+func f() { while (false) { print(1); } }
+func main() { f(); print("after"); }""",
+    "error line": """
+func main() {
+  i = 0;
+  while (i < 3) {
+    i = i + 1;
+    if (i == 2) { print("s" - i); }
+  }
+}""",
+    # nested past CPython's limits on loops and indentation
+    "nested whiles": "func main() { i = 0; "
+    + "while (i < 1) { " * 25
+    + "i = i + 1; print(i);"
+    + " }" * 25
+    + " }",
+    "nested ifs": "func main() { x = 1; "
+    + "if (x == 1) { " * 120
+    + 'print("deep");'
+    + " }" * 120
+    + " }",
+    # deeper than the passes and compilers could recurse, half of it folded
+    "deep blocks": "func main() { x = true; "
+    + "if (x) { if (true) { " * 300
+    + "print(x);"
+    + " } }" * 300
+    + " }",
+    # the error is raised 4000 calls down and has to pass back up them all
+    "deep error": """
+func f(n) {
+  if (n == 0) { return "s" - 1; }
+  x = f(n - 1);
+  return x;
+}
+func main() { print(f(4000)); }""",
+}
+
+
+def run(engine, program):
+    interpreter = Interpreter(
+        console_output=False, inp=["3"], engine=engine, max_call_depth=MAX_CALL_DEPTH
+    )
+    try:
+        interpreter.run(program)
+        error = None
+    except Exception as e:
+        error = (e.__class__.__name__, str(e), interpreter.get_error_type_and_line())
+    return interpreter.get_output(), error
+
+
+def main():
+    failures = 0
+    for name, program in PROGRAMS.items():
+        results = {engine: run(engine, program) for engine in Interpreter.ENGINES}
+        expected = results[Interpreter.ENGINES[0]]
+        for engine, result in results.items():
+            if result != expected:
+                failures += 1
+                print(f"{name}: {engine} gave {result}, expected {expected}")
+        print(f"{name}: {expected}")
+    print(f"{failures} mismatches")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+# Reports what importing interpreterv1 and interpreterv2 costs, as the
+# cumulative microseconds `python -X importtime` gives the top-level module
+# (best of RUNS fresh interpreters), and checks that importing interpreterv2
+# leaves PLY, brewtab and pickle unloaded: they're only needed on the first
+# parse. Exits with status 1 if any of them were imported.
+#
+#   python bench/import_time.py
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MODULES = ("interpreterv1", "interpreterv2")
+RUNS = 7
+# loaded only once something is parsed
+DEFERRED = ("ply", "ply.lex", "ply.yacc", "brewtab", "pickle")
+
+
+# Cumulative microseconds -X importtime reports for module in a fresh process
+def import_time(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1])
+    raise RuntimeError(f"no import time reported for {module}")
+
+
+# The modules in DEFERRED that importing interpreterv2 loads
+def loaded_early():
+    check = (
+        "import sys, interpreterv2; "
+        f"print(' '.join(m for m in {DEFERRED!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.split()
+
+
+def main():
+    for module in MODULES:
+        best = min(import_time(module) for _ in range(RUNS))
+        print(f"{module:14s} {best:8d} us")
+    early = loaded_early()
+    if early:
+        print(f"import interpreterv2 loaded {', '.join(early)}")
+        return 1
+    print(f"import interpreterv2 left {', '.join(DEFERRED)} unloaded")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+# Fuzzes brewscan against the lexer PLY builds from the same brewlex rules:
+# for random short sources, scan must give the same tokens, lines and
+# positions as PLY and print the same illegal character messages, and
+# scan_chunks must give the same as scan however the source is split into
+# chunks. Prints the first source they disagree on and exits with status 1.
+#
+#   python bench/lex_equivalence.py [cases] [seed]
+import contextlib
+import io
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ply import lex
+
+import brewlex
+import brewscan
+
+PIECES = list('abz_09 \t\n"/*=!<>&|+-(){},;.@#$\\é') + [
+    "func",
+    "if",
+    "while",
+    "/*",
+    "*/",
+    "==",
+    "&&",
+    "||",
+]
+
+
+def ply_tokens(lexer, source):
+    lexer.lineno = 1
+    lexer.input(source)
+    return [(tok.type, tok.value, tok.lineno, tok.lexpos) for tok in lexer]
+
+
+def random_chunks(rand, source):
+    chunks = []
+    start = 0
+    while start < len(source):
+        size = rand.randint(0, 4)
+        chunks.append(source[start : start + size])
+        start += size
+    return chunks
+
+
+# The tokens tokenize(source) gives, and what it printed
+def lexed(tokenize, source):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        tokens = tokenize(source)
+    return tokens, out.getvalue()
+
+
+def main(cases=20000, seed=1):
+    rand = random.Random(seed)
+    lexer = lex.lex(module=brewlex)
+    for _ in range(cases):
+        source = "".join(rand.choice(PIECES) for _ in range(rand.randint(0, 60)))
+        chunks = random_chunks(rand, source)
+        expected = lexed(brewscan.tokenize, source)
+        results = {
+            "PLY": lexed(lambda s: ply_tokens(lexer, s), source),
+            f"scan_chunks {chunks!r}": lexed(
+                lambda s: list(brewscan.scan_chunks(chunks)), source
+            ),
+        }
+        for name, result in results.items():
+            if result != expected:
+                print(f"{source!r}: scan gave {expected}, {name} gave {result}")
+                return 1
+    print(f"{cases} sources lexed the same")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:])))
@@ -0,0 +1,70 @@
+# Times brewscan on inputs that used to make it quadratic: one huge comment,
+# a long run of "/*" that's never closed, and both of those plus one very
+# long line fed through scan_chunks a chunk at a time. Each case is run at
+# three sizes, each four times the last; the time per unit of input should
+# stay flat. Exits with status 1 if it grows more than SLOWDOWN times from
+# the smallest size to the largest.
+#
+#   python bench/lex_pathological.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import brewscan
+
+SLOWDOWN = 3
+CHUNK = 1 << 16
+
+
+def big_comment(n):
+    return "func main() { /*" + "ab * c /\n" * n + "*/ }"
+
+
+def unclosed_comments(n):
+    return "/* x\n" * n
+
+
+def long_line(n):
+    return "func main() { " + "x = x + 1; " * n + "}"
+
+
+def scan_chunked(text):
+    chunks = [text[i : i + CHUNK] for i in range(0, len(text), CHUNK)]
+    return list(brewscan.scan_chunks(chunks))
+
+
+CASES = [
+    # name, source of n units, smallest n, lexer
+    ("comment", big_comment, 1 << 16, brewscan.tokenize),
+    ("unclosed /*", unclosed_comments, 1 << 13, brewscan.tokenize),
+    ("chunked comment", big_comment, 1 << 16, scan_chunked),
+    ("chunked unclosed /*", unclosed_comments, 1 << 13, scan_chunked),
+    ("chunked long line", long_line, 1 << 12, scan_chunked),
+]
+
+
+def per_unit(make, n, lex):
+    source = make(n)
+    start = time.perf_counter()
+    lex(source)
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    brewscan.warm_up()
+    failures = 0
+    for name, make, smallest, lex in CASES:
+        times = [per_unit(make, smallest << (2 * i), lex) for i in range(3)]
+        growth = times[-1] / times[0]
+        cost = "  ".join(f"{t * 1e6:7.3f}" for t in times)
+        print(f"{name:20s} us/unit {cost}   x{growth:.1f}")
+        if growth > SLOWDOWN:
+            failures += 1
+    print(f"{failures} cases grew faster than linear")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+# Times brewscan against the lexer PLY builds from the same brewlex rules,
+# on generated sources of 1, 4 and 16 MB made of one function repeated
+# (comments, arithmetic, comparisons, strings, ifs and whiles). Each time is
+# the best of three; both lexers must produce the same number of tokens.
+#
+#   python bench/lex_speed.py [MB ...]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ply import lex
+
+import brewlex
+import brewscan
+
+SIZES = (1, 4, 16)  # MB
+UNIT = """/* helper number %d */
+func f%d(a, b) {
+  x = a * 2 + b - 17;
+  if (x >= 100 && b != 3) { print("big", x); } else { x = -x; }
+  while (x < 1000 || !done) { x = x + 1; }
+  return x;
+}
+"""
+
+
+def source(mb):
+    parts = []
+    size = 0
+    while size < mb << 20:
+        parts.append(UNIT % (len(parts), len(parts)))
+        size += len(parts[-1])
+    parts.append("func main() { print(1); }\n")
+    return "".join(parts)
+
+
+def ply_count(lexer, text):
+    lexer.lineno = 1
+    lexer.input(text)
+    count = 0
+    while lexer.token() is not None:
+        count += 1
+    return count
+
+
+def scan_count(text):
+    return len(brewscan.tokenize(text))
+
+
+# The best time of three runs of count(text), and what it returned
+def best(count, text):
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        result = count(text)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main(*sizes):
+    lexer = lex.lex(module=brewlex)
+    brewscan.warm_up()
+    for mb in sizes or SIZES:
+        text = source(mb)
+        ply_time, ply_tokens = best(lambda text: ply_count(lexer, text), text)
+        scan_time, scan_tokens = best(scan_count, text)
+        assert ply_tokens == scan_tokens, (ply_tokens, scan_tokens)
+        print(
+            f"{mb:3d} MB {scan_tokens:9d} tokens  PLY {ply_time:6.2f}s"
+            f"  brewscan {scan_time:6.2f}s  x{ply_time / scan_time:.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*(int(arg) for arg in sys.argv[1:])))
@@ -0,0 +1,70 @@
+# Counts the Values a counting loop allocates on every engine, and the peak
+# memory tracemalloc sees while it runs. nil, booleans, INTs from
+# SMALL_INT_MIN to SMALL_INT_MAX and short strings are shared, so a loop
+# that stays in that range should allocate none; past it, each new INT
+# costs one. Exits with status 1 if the small loop allocates any.
+#
+#   python bench/value_allocs.py
+import os
+import sys
+import tracemalloc
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+warnings.simplefilter("ignore", SyntaxWarning)
+
+import type_valuev1
+from interpreterv2 import Interpreter
+
+PROGRAM = """
+func main() {
+  i = 0;
+  while (i < %d) {
+    i = i + 1;
+  }
+  print(i);
+}
+"""
+SMALL = 1000  # stays within the shared INTs
+LARGE = 10000
+
+
+# Runs program on engine, returning how many Values it allocated and the peak
+# bytes tracemalloc saw
+def measure(engine, program):
+    interpreter = Interpreter(console_output=False, engine=engine)
+    interpreter.run(program)  # parses and prepares the program
+    allocated = 0
+    new_value = type_valuev1._new_value
+
+    def counting(type, value):
+        nonlocal allocated
+        allocated += 1
+        return new_value(type, value)
+
+    type_valuev1._new_value = counting
+    tracemalloc.start()
+    try:
+        interpreter.run(program)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        type_valuev1._new_value = new_value
+    return allocated, peak
+
+
+def main():
+    failures = 0
+    print(f"{'':8s}{'N':>7s}{'Values':>9s}{'peak KiB':>10s}")
+    for engine in Interpreter.ENGINES:
+        for n in (SMALL, LARGE):
+            allocated, peak = measure(engine, PROGRAM % n)
+            print(f"{engine:8s}{n:7d}{allocated:9d}{peak / 1024:10.0f}")
+            if n == SMALL and allocated:
+                failures += 1
+    print(f"{failures} engines allocated Values for small INTs")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,3 @@
-from ply import lex
-
 reserved = (
     "FUNC",
     "IF",
@@ -110,13 +108,15 @@ def t_newline(t):
     t.lexer.lineno += t.value.count("\n")
 
 
+# Both patterns below scan in linear time: neither can match the same text
+# more than one way, so a long comment or string never backtracks
 def t_comment(t):
-    r"/\*(.|\n)*?\*/"
+    r"/\*[^*]*\*+(?:[^/*][^*]*\*+)*/"
     t.lexer.lineno += t.value.count("\n")
 
 
 def t_STRING(t):
-    r'".*?"'
+    r'"[^"\n]*"'
     t.value = t.value[1:-1]
     return t
 
@@ -126,5 +126,4 @@ def t_error(t):
     t.lexer.skip(1)
 
 
-# Build the lexer
-lex.lex()
+# brewscan compiles these rules into the lexer brewparse uses
@@ -1,7 +1,12 @@
+import copy
+import sys
+import threading
+
 from element import Element
 from brewlex import *
+import brewscan
+from brewscan import BrewinLexer, mapped_chunks
 from intbase import InterpreterBase
-from ply import yacc
 
 # Parsing rules
 
@@ -38,18 +43,34 @@ def p_func(p):
     """func : FUNC NAME LPAREN formal_args RPAREN LBRACE statements RBRACE
     | FUNC NAME LPAREN RPAREN LBRACE statements RBRACE"""
     if len(p) == 9:  # handle with 1+ formal args
-        p[0] = Element(InterpreterBase.FUNC_DEF, name=p[2], args=p[4], statements=p[7])
+        p[0] = Element(
+            InterpreterBase.FUNC_DEF,
+            name=p[2],
+            args=p[4],
+            statements=p[7],
+            pos=p.lexpos(1),
+        )
     else:  # handle no formal args
-        p[0] = Element(InterpreterBase.FUNC_DEF, name=p[2], args=[], statements=p[6])
+        p[0] = Element(
+            InterpreterBase.FUNC_DEF,
+            name=p[2],
+            args=[],
+            statements=p[6],
+            pos=p.lexpos(1),
+        )
 
 
 def p_lambda(p):
     """lambda : LAMBDA LPAREN formal_args RPAREN LBRACE statements RBRACE
     | LAMBDA LPAREN RPAREN LBRACE statements RBRACE"""
     if len(p) == 8:  # handle with 1+ formal args
-        p[0] = Element(InterpreterBase.LAMBDA_DEF, args=p[3], statements=p[6])
+        p[0] = Element(
+            InterpreterBase.LAMBDA_DEF, args=p[3], statements=p[6], pos=p.lexpos(1)
+        )
     else:  # handle no formal args
-        p[0] = Element(InterpreterBase.LAMBDA_DEF, args=[], statements=p[5])
+        p[0] = Element(
+            InterpreterBase.LAMBDA_DEF, args=[], statements=p[5], pos=p.lexpos(1)
+        )
 
 
 def p_formal_args(p):
@@ -60,12 +81,12 @@ def p_formal_args(p):
 
 def p_formal_arg(p):
     "formal_arg : NAME"
-    p[0] = Element(InterpreterBase.ARG_DEF, name=p[1])
+    p[0] = Element(InterpreterBase.ARG_DEF, name=p[1], pos=p.lexpos(1))
 
 
 def p_formal_ref_arg(p):
     "formal_arg : REF NAME"
-    p[0] = Element(InterpreterBase.REFARG_DEF, name=p[2])
+    p[0] = Element(InterpreterBase.REFARG_DEF, name=p[2], pos=p.lexpos(1))
 
 
 def p_statements(p):
@@ -76,7 +97,7 @@ def p_statements(p):
 
 def p_statement___assign(p):
     "statement : variable ASSIGN expression SEMI"
-    p[0] = Element("=", name=p[1], expression=p[3])
+    p[0] = Element("=", name=p[1], expression=p[3], pos=p.lexpos(2))
 
 
 def p_variable(p):
@@ -86,6 +107,7 @@ def p_variable(p):
         p[0] = p[1] + "." + p[3]
     else:
         p[0] = p[1]
+    p.set_lexpos(0, p.lexpos(1))  # for p_expression_variable
 
 
 def p_statement_if(p):
@@ -98,6 +120,7 @@ def p_statement_if(p):
             condition=p[3],
             statements=p[6],
             else_statements=None,
+            pos=p.lexpos(1),
         )
     else:
         p[0] = Element(
@@ -105,12 +128,15 @@ def p_statement_if(p):
             condition=p[3],
             statements=p[6],
             else_statements=p[10],
+            pos=p.lexpos(1),
         )
 
 
 def p_statement_while(p):
     "statement : WHILE LPAREN expression RPAREN LBRACE statements RBRACE"
-    p[0] = Element(InterpreterBase.WHILE_DEF, condition=p[3], statements=p[6])
+    p[0] = Element(
+        InterpreterBase.WHILE_DEF, condition=p[3], statements=p[6], pos=p.lexpos(1)
+    )
 
 
 def p_statement_expr(p):
@@ -125,17 +151,17 @@ def p_statement_return(p):
         expr = p[2]
     else:
         expr = None
-    p[0] = Element(InterpreterBase.RETURN_DEF, expression=expr)
+    p[0] = Element(InterpreterBase.RETURN_DEF, expression=expr, pos=p.lexpos(1))
 
 
 def p_expression_not(p):
     "expression : NOT expression"
-    p[0] = Element(InterpreterBase.NOT_DEF, op1=p[2])
+    p[0] = Element(InterpreterBase.NOT_DEF, op1=p[2], pos=p.lexpos(1))
 
 
 def p_expression_uminus(p):
     "expression : MINUS expression %prec UMINUS"
-    p[0] = Element(InterpreterBase.NEG_DEF, op1=p[2])
+    p[0] = Element(InterpreterBase.NEG_DEF, op1=p[2], pos=p.lexpos(1))
 
 
 def p_arith_expression_binop(p):
@@ -149,7 +175,7 @@ def p_arith_expression_binop(p):
     | expression MINUS expression
     | expression MULTIPLY expression
     | expression DIVIDE expression"""
-    p[0] = Element(p[2], op1=p[1], op2=p[3])
+    p[0] = Element(p[2], op1=p[1], op2=p[3], pos=p.lexpos(2))
 
 
 def p_expression_group(p):
@@ -160,12 +186,12 @@ def p_expression_group(p):
 def p_expression_and_or(p):
     """expression : expression OR expression
     | expression AND expression"""
-    p[0] = Element(p[2], op1=p[1], op2=p[3])
+    p[0] = Element(p[2], op1=p[1], op2=p[3], pos=p.lexpos(2))
 
 
 def p_expression_number(p):
     "expression : NUMBER"
-    p[0] = Element(InterpreterBase.INT_DEF, val=p[1])
+    p[0] = Element(InterpreterBase.INT_DEF, val=p[1], pos=p.lexpos(1))
 
 
 def p_expression_lambda(p):
@@ -177,47 +203,51 @@ def p_expression_bool(p):
     """expression : TRUE
     | FALSE"""
     bool_val = p[1] == InterpreterBase.TRUE_DEF
-    p[0] = Element(InterpreterBase.BOOL_DEF, val=bool_val)
+    p[0] = Element(InterpreterBase.BOOL_DEF, val=bool_val, pos=p.lexpos(1))
 
 
 def p_expression_nil(p):
     "expression : NIL"
-    p[0] = Element(InterpreterBase.NIL_DEF)
+    p[0] = Element(InterpreterBase.NIL_DEF, pos=p.lexpos(1))
 
 
 def p_expression_obj(
     p,
 ):  # e.g. a = @;   ### creates a new dictionary/object and stores in a
     "expression : AT"
-    p[0] = Element(InterpreterBase.OBJ_DEF)
+    p[0] = Element(InterpreterBase.OBJ_DEF, pos=p.lexpos(1))
 
 
 def p_expression_string(p):
     "expression : STRING"
-    p[0] = Element(InterpreterBase.STRING_DEF, val=p[1])
+    p[0] = Element(InterpreterBase.STRING_DEF, val=p[1], pos=p.lexpos(1))
 
 
 def p_expression_variable(p):
     "expression : variable"
-    p[0] = Element(InterpreterBase.VAR_DEF, name=p[1])
+    p[0] = Element(InterpreterBase.VAR_DEF, name=p[1], pos=p.lexpos(1))
 
 
 def p_func_call(p):
     """expression : NAME LPAREN args RPAREN
     | NAME LPAREN RPAREN"""
     if len(p) == 5:
-        p[0] = Element(InterpreterBase.FCALL_DEF, name=p[1], args=p[3])
+        args = p[3]
     else:
-        p[0] = Element(InterpreterBase.FCALL_DEF, name=p[1], args=[])
+        args = []
+    p[0] = Element(InterpreterBase.FCALL_DEF, name=p[1], args=args, pos=p.lexpos(1))
 
 
 def p_method_call(p):
     """expression : NAME DOT NAME LPAREN args RPAREN
     | NAME DOT NAME LPAREN RPAREN"""
     if len(p) == 7:
-        p[0] = Element(InterpreterBase.MCALL_DEF, objref=p[1], name=p[3], args=p[5])
+        args = p[5]
     else:
-        p[0] = Element(InterpreterBase.MCALL_DEF, objref=p[1], name=p[3], args=[])
+        args = []
+    p[0] = Element(
+        InterpreterBase.MCALL_DEF, objref=p[1], name=p[3], args=args, pos=p.lexpos(1)
+    )
 
 
 def p_expression_args(p):
@@ -233,13 +263,105 @@ def p_error(p):
         print("Syntax error at EOF")
 
 
+# the template parser is built on first use, see warm_up()
+parser = None
+_warm_up_lock = threading.Lock()
+
+
+# exported function
+# Builds the template parser (from the precompiled tables when they are
+# current) and brewscan's regexes if that hasn't happened yet. Parsing does
+# this on first use; servers can call it up front to pay the cost before
+# taking traffic.
+def warm_up():
+    global parser
+    with _warm_up_lock:
+        if parser is None:
+            import brewtab
+
+            brewscan.warm_up()
+            parser = brewtab.load_tables(sys.modules[__name__])
+
+
+# A parser that owns its lexer and LR parser state, so separate instances can
+# parse on separate threads at the same time. The LALR tables themselves are
+# read-only and shared with the template. Tokens come from brewscan, which
+# splits a source exactly as the PLY lexer would, only faster.
+class BrewinParser:
+    def __init__(self):
+        if parser is None:
+            warm_up()
+        self.lexer = BrewinLexer()
+        self.parser = copy.copy(parser)
+
+    def parse(self, program):
+        self.lexer.input(program)
+        return self.__parse()
+
+    # Parses the source in the file at path, lexing it straight from a memory
+    # map of the file rather than reading it all into a str first
+    def parse_file(self, path, encoding="utf-8"):
+        with open(path, "rb") as file:
+            self.lexer.input_chunks(mapped_chunks(file, encoding))
+            return self.__parse()
+
+    # Parses the tokens in buffer, a brewscan.TokenBuffer
+    def parse_tokens(self, buffer):
+        self.lexer.input_buffer(buffer)
+        return self.__parse()
+
+    def __parse(self):
+        ast = self.parser.parse(lexer=self.lexer)
+        if ast is None:
+            raise SyntaxError("Syntax error")
+        ast.lines = self.lexer.lines
+        return ast
+
+
+# A pool of BrewinParsers for multi-threaded callers. Each parse checks out an
+# idle parser (creating one if there is none) and returns it afterwards; at
+# most max_idle parsers are kept around between parses.
+class ParserPool:
+    def __init__(self, max_idle=8):
+        self.max_idle = max_idle
+        self.__idle = []
+        self.__lock = threading.Lock()
+
+    def parse(self, program):
+        return self.__with_parser(BrewinParser.parse, program)
+
+    def parse_file(self, path, encoding="utf-8"):
+        return self.__with_parser(BrewinParser.parse_file, path, encoding)
+
+    def parse_tokens(self, buffer):
+        return self.__with_parser(BrewinParser.parse_tokens, buffer)
+
+    def __with_parser(self, parse, *args):
+        with self.__lock:
+            brewin_parser = self.__idle.pop() if self.__idle else None
+        if brewin_parser is None:
+            brewin_parser = BrewinParser()
+        try:
+            return parse(brewin_parser, *args)
+        finally:
+            with self.__lock:
+                if len(self.__idle) < self.max_idle:
+                    self.__idle.append(brewin_parser)
+
+
+_pool = ParserPool()
+
+
 # exported function
 def parse_program(program):
-    ast = yacc.parse(program)
-    if ast is None:
-        raise SyntaxError("Syntax error")
-    return ast
+    return _pool.parse(program)
 
 
-# generate our parser
-yacc.yacc()
+# exported function
+def parse_file(path, encoding="utf-8"):
+    return _pool.parse_file(path, encoding)
+
+
+# exported function
+def parse_tokens(buffer):
+    return _pool.parse_tokens(buffer)
@@ -0,0 +1,342 @@
+# Fast tokenizer for Brewin, used by brewparse in place of PLY's generic lexer.
+#
+# Every rule in brewlex becomes a named group of one compiled regex, in the
+# order PLY's master regex tries them (function rules in source order, then
+# string rules, longest regex first), so the two always split a source the
+# same way. A single finditer pass then walks the whole source: blanks and
+# tabs, newlines, comments and illegal characters match groups of their own,
+# so there are no gaps between matches, and each match is turned into a token
+# with one dict lookup rather than a LexToken and a rule function call.
+#
+# Tokens are (type, value, lineno, lexpos) tuples, with the type names of
+# brewlex.tokens and values exactly as brewlex's rules leave them.
+import bisect
+import codecs
+import mmap
+import os
+import re
+import types
+from array import array
+
+import brewlex
+
+CHUNK_SIZE = 1 << 20  # bytes of a file decoded and lexed at a time
+_IGNORED = {"newline", "comment"}  # rules that don't produce a token
+
+
+# The rule functions with the given prefix, in the source order PLY uses
+def rule_funcs(module, prefix):
+    funcs = [
+        value
+        for name, value in vars(module).items()
+        if name.startswith(prefix) and isinstance(value, types.FunctionType)
+    ]
+    funcs.sort(key=lambda f: (f.__code__.co_filename, f.__code__.co_firstlineno))
+    return funcs
+
+
+def _master_regex(without=()):
+    rules = [(func.__name__[2:], func.__doc__) for func in rule_funcs(brewlex, "t_")]
+    rules = [(name, regex) for name, regex in rules if name not in without]
+    strings = [
+        (name[2:], value)
+        for name, value in vars(brewlex).items()
+        if name.startswith("t_") and isinstance(value, str) and name != "t_ignore"
+    ]
+    strings.sort(key=lambda rule: len(rule[1]), reverse=True)
+    groups = [f"(?P<ignore>[{re.escape(brewlex.t_ignore)}]+)"]
+    groups += [f"(?P<{name}>{regex})" for name, regex in rules + strings]
+    groups.append("(?P<error>.)")
+    return re.compile("|".join(groups))
+
+
+# Every token type, indexed by the ids a TokenBuffer stores: those of
+# brewlex.tokens, then the literals, which are their own types
+TOKEN_TYPES = brewlex.tokens + tuple(brewlex.literals)
+_TYPE_IDS = {token_type: i for i, token_type in enumerate(TOKEN_TYPES)}
+# the master regexes are compiled on first use, see warm_up()
+_MASTER = None
+# For text after the last "*/", where no comment can start
+_MASTER_NO_COMMENTS = None
+_NEWLINE = re.compile("\n")
+_LITERALS = set(brewlex.literals)
+_RESERVED = brewlex.reserved_map
+
+
+# Compiles the master regexes if that hasn't happened yet. brewparse.warm_up
+# calls this; lexing does it on first use.
+def warm_up():
+    global _MASTER, _MASTER_NO_COMMENTS
+    if _MASTER_NO_COMMENTS is None:
+        _MASTER = _master_regex(without={"error"})
+        _MASTER_NO_COMMENTS = _master_regex(without={"error", "comment"})
+
+
+# Yields the tokens of program one at a time, in the order PLY's lexer
+# would, printing the same message for an illegal character when it's reached
+def scan(program):
+    yield from _scan_text(program, 1, 0, True)
+
+
+# Like scan, but over a source that arrives as successive str chunks. Only
+# the text a token could still run on into is held back between chunks, so
+# lexpos and lineno come out as if the chunks were one string.
+def scan_chunks(chunks):
+    lineno = 1
+    base = 0  # lexpos of the start of text
+    text = ""
+    chunks = iter(chunks)
+    for chunk in chunks:
+        text += chunk
+        lineno, resume = yield from _scan_text(text, lineno, base, False)
+        base += resume
+        text = text[resume:]
+        if text.startswith("/*"):
+            text, skipped, newlines, closed = _skip_comment(text, chunks)
+            if closed:
+                base += skipped
+                lineno += newlines
+    yield from _scan_text(text, lineno, base, True)
+
+
+# Reads on through chunks to the end of the comment that text starts with,
+# looking for its "*/" in each new chunk only, rather than holding the
+# comment in one string and searching it again from the start. Returns the
+# text after the comment, how long the comment was, the newlines in it and
+# True; or, if chunks run out first, the rest of the source and False, since
+# a "/*" that's never closed isn't a comment.
+def _skip_comment(text, chunks):
+    close = text.find("*/", 2)
+    if close >= 0:
+        return text[close + 2 :], close + 2, text.count("\n", 0, close), True
+    pieces = [text]  # only needed if the comment is never closed
+    length = len(text)
+    newlines = text.count("\n")
+    last = text[-1] if len(text) > 2 else ""  # not the "*" of "/*"
+    for chunk in chunks:
+        close = (last + chunk).find("*/")
+        if close >= 0:
+            end = close + 2 - len(last)  # in chunk
+            return chunk[end:], length + end, newlines + chunk.count("\n", 0, end), True
+        pieces.append(chunk)
+        length += len(chunk)
+        newlines += chunk.count("\n")
+        if chunk:
+            last = chunk[-1]
+    return "".join(pieces), length, newlines, False
+
+
+# Yields the tokens of text, which starts at lexpos base, on line lineno. If
+# more text could follow (final is false), returns the line and the place in
+# text to go on from. Only a comment can run on past a newline, so it stops
+# at the last newline in text, or earlier at a comment that isn't closed yet.
+# Text with no newline at all is one line that may go on: it stops at the
+# first token more text could change.
+def _scan_text(text, lineno, base, final):
+    end = len(text) if final else text.rfind("\n")
+    held = None
+    if end >= 0:
+        matches = _matches(text, end)
+    else:
+        end = len(text)
+        held = [end]
+        matches = _settled(_matches(text, end), text, held)
+    for match in matches:
+        kind = match.lastgroup
+        if kind == "ignore":
+            continue
+        value = match.group()
+        if kind == "NAME":
+            yield _RESERVED.get(value, "NAME"), value, lineno, base + match.start()
+        elif kind == "NUMBER":
+            yield kind, int(value), lineno, base + match.start()
+        elif kind == "STRING":
+            yield kind, value[1:-1], lineno, base + match.start()
+        elif kind in _IGNORED:
+            lineno += value.count("\n")
+        elif kind != "error":
+            if kind == "DIVIDE" and not final and text.startswith("*", match.end()):
+                return lineno, match.start()
+            yield kind, value, lineno, base + match.start()
+        elif value in _LITERALS:
+            yield value, value, lineno, base + match.start()
+        else:
+            print(f"Illegal character {value}")
+    return lineno, end if held is None else held[0]
+
+
+# Passes matches on up to the first one that could change if the line went
+# on: one that runs to the end of text, or a '"' that nothing closes yet.
+# Leaves where that one starts in held[0].
+def _settled(matches, text, held):
+    size = len(text)
+    for match in matches:
+        if match.end() == size or (
+            match.lastgroup == "error" and match.group() == '"'
+        ):
+            held[0] = match.start()
+            return
+        yield match
+
+
+# The matches of the master regex in text up to end. Trying the comment rule
+# at a "/*" that's never closed costs a scan to the end of text; past the
+# last "*/" it's known to fail, so it isn't tried there, and a run of "/*"s
+# with no "*/" after them takes linear time instead of quadratic.
+def _matches(text, end):
+    if _MASTER_NO_COMMENTS is None:
+        warm_up()
+    closed = text.rfind("*/", 0, end) + 2
+    if text.find("/*", closed, end) < 0:
+        return _MASTER.finditer(text, 0, end)
+    return _matches_split(text, closed, end)
+
+
+def _matches_split(text, closed, end):
+    pos = 0
+    for match in _MASTER.finditer(text, 0, end):
+        if match.start() >= closed:
+            break
+        yield match
+        pos = match.end()
+    yield from _MASTER_NO_COMMENTS.finditer(text, pos, end)
+
+
+# Decodes file, which must be opened in binary mode, a chunk at a time from
+# a memory map of it, so only the chunk being lexed is ever held as a str
+def mapped_chunks(file, encoding="utf-8", chunk_size=CHUNK_SIZE):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    if os.fstat(file.fileno()).st_size == 0:
+        return  # an empty file can't be mapped
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as source:
+        for start in range(0, len(source), chunk_size):
+            yield decoder.decode(source[start : start + chunk_size])
+    yield decoder.decode(b"", final=True)
+
+
+# All the tokens of program, as a list
+def tokenize(program):
+    return list(scan(program))
+
+
+# The tokens of a whole source, held column by column rather than as a tuple
+# or LexToken apiece: a type id (into TOKEN_TYPES), value id, line and lexpos
+# per token, in arrays, and each distinct value once, in values. Takes any
+# iterable of tokens, e.g. TokenBuffer(scan(program)).
+class TokenBuffer:
+    def __init__(self, tokens=()):
+        self.type_ids = array("H")
+        self.value_ids = array("I")
+        self.linenos = array("I")
+        self.lexposes = array("I")
+        self.values = []  # distinct values, indexed by value_ids
+        self.__value_ids = {}  # value -> its index in values
+        self.extend(tokens)
+
+    def extend(self, tokens):
+        value_ids = self.__value_ids
+        for token_type, value, lineno, lexpos in tokens:
+            value_id = value_ids.get(value)
+            if value_id is None:
+                value_id = value_ids[value] = len(self.values)
+                self.values.append(value)
+            self.type_ids.append(_TYPE_IDS[token_type])
+            self.value_ids.append(value_id)
+            self.linenos.append(lineno)
+            self.lexposes.append(lexpos)
+
+    def __len__(self):
+        return len(self.type_ids)
+
+    def __getitem__(self, i):
+        return (
+            TOKEN_TYPES[self.type_ids[i]],
+            self.values[self.value_ids[i]],
+            self.linenos[i],
+            self.lexposes[i],
+        )
+
+    # Yields the tokens back as (type, value, lineno, lexpos) tuples
+    def __iter__(self):
+        values = self.values
+        columns = zip(self.type_ids, self.value_ids, self.linenos, self.lexposes)
+        for type_id, value_id, lineno, lexpos in columns:
+            yield TOKEN_TYPES[type_id], values[value_id], lineno, lexpos
+
+
+# The offset at which each line of a source starts, so the line of a lexpos
+# can be found by binary search when it's needed (to report an error) rather
+# than carried by every token and node
+class LineIndex:
+    def __init__(self, text=""):
+        self.starts = array("I", [0])
+        self.size = 0  # characters indexed so far
+        self.add(text)
+
+    # Indexes text, which follows whatever was added before
+    def add(self, text):
+        base = self.size
+        self.starts.extend(base + match.end() for match in _NEWLINE.finditer(text))
+        self.size += len(text)
+
+    # Yields chunks, indexing each one as it passes
+    def reading(self, chunks):
+        for chunk in chunks:
+            self.add(chunk)
+            yield chunk
+
+    def line(self, lexpos):
+        return bisect.bisect_right(self.starts, lexpos)
+
+
+# A LineIndex for the tokens in buffer, whose source isn't at hand: each
+# line starts at its first token, which is all the positions of its tokens
+# need. A line without tokens starts where the next line with some does.
+def _buffer_lines(buffer):
+    lines = LineIndex()
+    starts = lines.starts
+    for lineno, lexpos in zip(buffer.linenos, buffer.lexposes):
+        while len(starts) < lineno:
+            starts.append(lexpos)
+    return lines
+
+
+# What BrewinLexer hands yacc for each token: the attributes of a PLY
+# LexToken, without importing PLY to get one
+class Token:
+    def __repr__(self):
+        return f"Token({self.type},{self.value!r},{self.lineno},{self.lexpos})"
+
+
+# Lexer that yacc can take in place of a PLY one; it only needs input() and
+# token(). lines is the LineIndex of the source being lexed.
+class BrewinLexer:
+    def __init__(self):
+        self.lineno = 1
+        self.lexpos = 0
+        self.lines = LineIndex()
+        self.__tokens = iter(())
+
+    def input(self, program):
+        self.lines = LineIndex(program)
+        self.__tokens = scan(program)
+
+    # Takes the source as successive str chunks instead (see scan_chunks)
+    def input_chunks(self, chunks):
+        self.lines = LineIndex()
+        self.__tokens = scan_chunks(self.lines.reading(chunks))
+
+    # Takes the tokens from a TokenBuffer that's already been filled
+    def input_buffer(self, buffer):
+        self.lines = _buffer_lines(buffer)
+        self.__tokens = iter(buffer)
+
+    def token(self):
+        token = next(self.__tokens, None)
+        if token is None:
+            return None
+        tok = Token()
+        tok.type, tok.value, tok.lineno, tok.lexpos = token
+        self.lineno = tok.lineno
+        self.lexpos = tok.lexpos
+        return tok
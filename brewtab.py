@@ -0,0 +1,135 @@
+# Precompiled parser tables for the Brewin front end.
+#
+# Building the PLY parser from scratch means reflecting over every p_ rule,
+# validating them and generating the LALR tables. Instead we keep the tables
+# in a pickle that is keyed on a hash of the grammar: the token list,
+# precedence and the production docstrings. A current table file is loaded
+# without any PLY reflection; a missing or stale one is rebuilt and swapped in
+# atomically so concurrent workers never read a half-written file. (Tokens
+# come from brewscan, which needs no tables.)
+#
+# Run `python brewtab.py` as a build step to write the tables ahead of time.
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+from brewscan import rule_funcs
+from ply import yacc
+
+# bump this whenever the layout of the pickled tables changes
+TABLE_VERSION = 2
+TABLE_FILE = os.environ.get(
+    "BREWIN_TABLE_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "brewtab.pickle"),
+)
+# the tables are read by whichever user runs the interpreter, which needn't be
+# the one that built them
+TABLE_MODE = 0o644
+
+
+# Hash of everything in the grammar module that affects the generated tables
+def grammar_signature(module):
+    digest = hashlib.sha256()
+
+    def add(*parts):
+        for part in parts:
+            digest.update(repr(part).encode("utf-8"))
+            digest.update(b"\0")
+
+    add(TABLE_VERSION, yacc.__tabversion__)
+    add(
+        getattr(module, "tokens", None),
+        getattr(module, "precedence", None),
+        getattr(module, "start", None),
+    )
+    for func in rule_funcs(module, "p_"):
+        add(func.__name__, func.__doc__)
+    return digest.hexdigest()
+
+
+# Same data as LRGeneratedTable.pickle_table()
+def _parser_tables(parser):
+    productions = []
+    for p in parser.productions:
+        if p.func:
+            productions.append(
+                (p.str, p.name, p.len, p.func, os.path.basename(p.file), p.line)
+            )
+        else:
+            productions.append((str(p), p.name, p.len, None, None, None))
+    return {
+        "method": "LALR",
+        "action": parser.action,
+        "goto": parser.goto,
+        "productions": productions,
+    }
+
+
+def _load_parser(tables, module):
+    lr = yacc.LRTable()
+    lr.lr_method = tables["method"]
+    lr.lr_action = tables["action"]
+    lr.lr_goto = tables["goto"]
+    lr.lr_productions = [yacc.MiniProduction(*p) for p in tables["productions"]]
+    lr.bind_callables(vars(module))
+    return yacc.LRParser(lr, getattr(module, "p_error", None))
+
+
+# Write the file next to its final location and rename it into place, so
+# readers only ever see the old tables or the complete new ones
+def _write_tables(tables, path):
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=".brewtab-", dir=os.path.dirname(path) or "."
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(tables, f, pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp_path, TABLE_MODE)  # mkstemp makes it 0600
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# Reflect over the grammar module, build the parser, and save its tables to
+# path. Returns the parser.
+def build_tables(module, path=TABLE_FILE):
+    parser = yacc.yacc(module=module, debug=False, write_tables=False)
+    tables = {
+        "signature": grammar_signature(module),
+        "parser": _parser_tables(parser),
+    }
+    try:
+        _write_tables(tables, path)
+    except OSError as e:
+        # a read-only install still works, it just rebuilds every time
+        print(f"Couldn't write parser tables to {path}: {e}", file=sys.stderr)
+    return parser
+
+
+# Returns the parser for the grammar module, loading the tables from path
+# when they match the grammar and rebuilding them otherwise
+def load_tables(module, path=TABLE_FILE):
+    try:
+        with open(path, "rb") as f:
+            tables = pickle.load(f)
+        if tables["signature"] == grammar_signature(module):
+            return _load_parser(tables["parser"], module)
+        print(f"Parser tables in {path} are out of date, rebuilding", file=sys.stderr)
+    except FileNotFoundError:
+        pass  # not built yet
+    except Exception as e:
+        # unreadable or from an older layout
+        print(f"Couldn't load parser tables from {path}: {e!r}", file=sys.stderr)
+    return build_tables(module, path)
+
+
+if __name__ == "__main__":
+    import brewparse
+
+    build_tables(brewparse, sys.argv[1] if len(sys.argv) > 1 else TABLE_FILE)
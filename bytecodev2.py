@@ -0,0 +1,262 @@
+# Compiles the AST from brewparse into linear bytecode for vmv2.VM.
+#
+# Each function becomes a Code object: parallel lists of opcodes and operands
+# plus the constant, name and call-site tables the operands index into. The
+# compiled form follows the tree-walking interpreter statement by statement,
+# so both engines produce the same output and errors.
+from element import UNARY_OP_TYPES
+from intbase import InterpreterBase
+from type_valuev1 import Type, Value, create_value
+
+# opcodes
+LOAD_CONST = 0  # push consts[arg]
+LOAD_VAR = 1  # push the value in frame slot arg
+STORE_VAR = 2  # pop a value into frame slot arg
+BINARY_OP = 3  # pop right, pop left, push OPERATORS[arg] applied to them
+UNARY_OP = 4  # pop a value, push OPERATORS[arg] applied to it
+CALL = 5  # pop the arguments of calls[arg] = (call node, argc), push the result
+POP = 6  # discard the top of the stack
+JUMP = 7  # continue at arg
+JUMP_IF_FALSE = 8  # pop a condition, continue at arg if it doesn't hold
+RETURN = 9  # pop a value and return it from the function
+TRACE = 10  # print consts[arg], the statement about to run
+# operators proven by inferv2 to have INT operands; consts[arg] computes the
+# result from the raw ints
+INT_BINARY_OP = 11  # pop right, pop left, push the INT result
+INT_UNARY_OP = 12  # pop a value, push the INT result
+TAIL_CALL = 13  # CALL for a call that's being returned (see Interpreter._tail_call)
+
+OPNAMES = (
+    "LOAD_CONST",
+    "LOAD_VAR",
+    "STORE_VAR",
+    "BINARY_OP",
+    "UNARY_OP",
+    "CALL",
+    "POP",
+    "JUMP",
+    "JUMP_IF_FALSE",
+    "RETURN",
+    "TRACE",
+    "INT_BINARY_OP",
+    "INT_UNARY_OP",
+    "TAIL_CALL",
+)
+
+OPERATORS = (
+    "+",
+    "-",
+    "*",
+    "/",
+    "==",
+    "<",
+    "<=",
+    ">",
+    ">=",
+    "!=",
+    "||",
+    "&&",
+    InterpreterBase.NEG_DEF,
+    InterpreterBase.NOT_DEF,
+)
+OPERATOR_INDEX = {op: i for i, op in enumerate(OPERATORS)}
+
+
+# The compiled body of one function
+class Code:
+    def __init__(self, name):
+        self.name = name
+        self.ops = []
+        self.args = []
+        self.consts = []
+        self.names = ()  # frame slot -> variable name
+        self.calls = []
+        # lexpos of the statement each instruction belongs to, for errors
+        self.positions = []
+        self.pos = None  # that of the statement being compiled
+
+    def emit(self, op, arg=0):
+        self.ops.append(op)
+        self.args.append(arg)
+        self.positions.append(self.pos)
+        return len(self.ops) - 1
+
+    # Points the jump emitted at index to the next instruction
+    def patch(self, index):
+        self.args[index] = len(self.ops)
+
+    def add_const(self, value):
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def add_call(self, call_ast, argc):
+        self.calls.append((call_ast, argc))
+        return len(self.calls) - 1
+
+    def disassemble(self):
+        lines = []
+        for pc, (op, arg) in enumerate(zip(self.ops, self.args)):
+            if op == LOAD_CONST or op == TRACE:
+                detail = str(self.consts[arg])
+            elif op == LOAD_VAR or op == STORE_VAR:
+                detail = self.names[arg]
+            elif op == BINARY_OP or op == UNARY_OP:
+                detail = OPERATORS[arg]
+            elif op == INT_BINARY_OP or op == INT_UNARY_OP:
+                detail = self.consts[arg].__name__
+            elif op == CALL or op == TAIL_CALL:
+                call_ast, argc = self.calls[arg]
+                detail = f"{call_ast.name}/{argc}"
+            elif op == JUMP or op == JUMP_IF_FALSE:
+                detail = f"-> {arg}"
+            else:
+                detail = ""
+            lines.append(f"{pc:4d} {OPNAMES[op]:<14} {detail}".rstrip())
+        return "\n".join(lines)
+
+
+class Compiler:
+    def __init__(self, trace_output=False):
+        self.trace_output = trace_output
+
+    def compile_function(self, func):
+        code = Code(func.get("name"))
+        code.names = func.slot_names
+        self.__statements(code, func.get("statements"))
+        # falling off the end returns nil, like a bare return statement
+        code.emit(LOAD_CONST, code.add_const(create_value(InterpreterBase.NIL_DEF)))
+        code.emit(RETURN)
+        return code
+
+    # Emits the code for statements. Like expressions in __expr, they're
+    # compiled from an explicit work list rather than by recursion, so deeply
+    # nested blocks don't grow the Python stack. Each entry is (step,
+    # statement, jump): a statement to compile, or what's left of an if or
+    # while to emit once the body pushed after it has been compiled.
+    def __statements(self, code, statements):
+        work = []
+        _push_statements(work, statements)
+        while work:
+            step, statement, jump = work.pop()
+            if step == "statement":
+                code.pos = statement.pos
+                if self.trace_output:
+                    code.emit(TRACE, code.add_const(statement))
+                self.__statement(code, statement, work)
+            elif step == "else":  # after the then-branch of an if with an else
+                to_end = code.emit(JUMP)
+                code.patch(jump)
+                work.append(("end", None, to_end))
+                _push_statements(work, statement.get("else_statements"))
+            elif step == "loop":  # after the body of a while
+                top, to_end = jump
+                code.emit(JUMP, top)
+                code.patch(to_end)
+            else:  # "end" of a block, where jump lands
+                code.patch(jump)
+
+    # Emits the code for statement, pushing the statements of a block onto
+    # work for __statements to compile
+    def __statement(self, code, statement, work):
+        kind = statement.elem_type
+        if kind == InterpreterBase.FCALL_DEF:
+            self.__expr(code, statement)
+            code.emit(POP)
+        elif kind == "=":
+            self.__expr(code, statement.get("expression"))
+            code.emit(STORE_VAR, statement.slot)
+        elif kind == InterpreterBase.IF_DEF:
+            self.__expr(code, statement.get("condition"))
+            to_else = code.emit(JUMP_IF_FALSE)
+            if statement.get("else_statements") is None:
+                work.append(("end", None, to_else))
+            else:
+                work.append(("else", statement, to_else))
+            _push_statements(work, statement.get("statements"))
+        elif kind == InterpreterBase.WHILE_DEF:
+            top = len(code.ops)
+            self.__expr(code, statement.get("condition"))
+            to_end = code.emit(JUMP_IF_FALSE)
+            work.append(("loop", None, (top, to_end)))
+            _push_statements(work, statement.get("statements"))
+        elif kind == InterpreterBase.RETURN_DEF:
+            if statement.get("expression") is None:
+                nil = create_value(InterpreterBase.NIL_DEF)
+                code.emit(LOAD_CONST, code.add_const(nil))
+            elif statement.get("expression").elem_type == InterpreterBase.FCALL_DEF:
+                call = statement.get("expression")
+                for arg in call.get("args"):
+                    self.__expr(code, arg)
+                code.emit(TAIL_CALL, code.add_call(call, len(call.get("args"))))
+            else:
+                self.__expr(code, statement.get("expression"))
+            code.emit(RETURN)
+        # other expression statements are not executed by the interpreter
+
+    # Emits the code for expr. Operands are compiled from an explicit work
+    # list rather than by recursion, so deeply nested expressions don't grow
+    # the Python stack; each operator is pushed back to be emitted after them.
+    def __expr(self, code, expr):
+        work = [(expr, False)]
+        while work:
+            expr, operands_done = work.pop()
+            kind = expr.elem_type
+            if operands_done:
+                self.__operator(code, expr)
+            elif kind == InterpreterBase.FCALL_DEF:
+                work.append((expr, True))
+                work.extend((arg, False) for arg in reversed(expr.get("args")))
+            elif kind in UNARY_OP_TYPES:
+                work.append((expr, True))
+                work.append((expr.get("op1"), False))
+            elif kind in OPERATOR_INDEX:
+                work.append((expr, True))
+                work.append((expr.get("op2"), False))
+                work.append((expr.get("op1"), False))
+            else:
+                self.__operand(code, expr)
+
+    def __operator(self, code, expr):
+        kind = expr.elem_type
+        if kind == InterpreterBase.FCALL_DEF:
+            code.emit(CALL, code.add_call(expr, len(expr.get("args"))))
+        elif kind in UNARY_OP_TYPES:
+            if expr.int_op is not None:
+                code.emit(INT_UNARY_OP, code.add_const(expr.int_op))
+            else:
+                code.emit(UNARY_OP, OPERATOR_INDEX[kind])
+        elif expr.int_op is not None:
+            code.emit(INT_BINARY_OP, code.add_const(expr.int_op))
+        else:
+            code.emit(BINARY_OP, OPERATOR_INDEX[kind])
+
+    def __operand(self, code, expr):
+        kind = expr.elem_type
+        if kind == InterpreterBase.INT_DEF:
+            code.emit(LOAD_CONST, code.add_const(Value(Type.INT, expr.get("val"))))
+        elif kind == InterpreterBase.STRING_DEF:
+            code.emit(LOAD_CONST, code.add_const(Value(Type.STRING, expr.get("val"))))
+        elif kind == InterpreterBase.BOOL_DEF:
+            code.emit(LOAD_CONST, code.add_const(Value(Type.BOOL, expr.get("val"))))
+        elif kind == InterpreterBase.NIL_DEF:
+            nil = create_value(InterpreterBase.NIL_DEF)
+            code.emit(LOAD_CONST, code.add_const(nil))
+        elif kind == InterpreterBase.VAR_DEF:
+            code.emit(LOAD_VAR, expr.slot)
+        else:
+            # lambdas, objects and method calls evaluate to None, as in the
+            # tree-walking interpreter
+            code.emit(LOAD_CONST, code.add_const(None))
+
+
+# Pushes statements onto the work list of Compiler.__statements, so they're
+# popped in order
+def _push_statements(work, statements):
+    work.extend(("statement", statement, None) for statement in reversed(statements))
+
+
+# Compiles every function in the program; returns a dict from each func
+# Element to its Code
+def compile_program(ast, trace_output=False):
+    compiler = Compiler(trace_output)
+    return {func: compiler.compile_function(func) for func in ast.get("functions")}
@@ -0,0 +1,261 @@
+# Closure-compiling engine: every Element is turned once into a Python
+# closure specialised for its node type, so running the program never looks
+# at elem_type or goes through Element.get again.
+#
+# Statement closures return None, or the Value of a return statement that
+# ended them; expression closures return their Value. Every closure takes the
+# frame of the function it runs in. As in vmv2, calls and operators go through
+# the shared Interpreter methods. A statement closure that can raise catches
+# the error on its way out to add the statement's line (_locate_error); the
+# try costs nothing unless something is raised.
+from intbase import InterpreterBase
+from type_valuev1 import Type, Value, create_value
+
+
+class ClosureEngine:
+    def __init__(self, interpreter, ast):
+        self.interpreter = interpreter
+        self.bodies = {}  # func Element -> closure running its statements
+        for func in ast.get("functions"):
+            self.bodies[func] = self.__block(func.get("statements"))
+
+    # Runs the body of func with its variables in frame and returns the Value
+    # it returned (or None)
+    def run_function(self, func, frame):
+        return self.bodies[func](frame)
+
+    def __block(self, statements):
+        compiled = tuple(self.__statement(s) for s in statements)
+        if self.interpreter.trace_output:
+            compiled = tuple(
+                self.__traced(s, c) for s, c in zip(statements, compiled)
+            )
+
+        if len(compiled) == 1:
+            return compiled[0]
+
+        def block(frame):
+            for statement in compiled:
+                result = statement(frame)
+                if result is not None:
+                    return result
+            return None
+
+        return block
+
+    def __traced(self, statement, compiled):
+        def traced(frame):
+            print(statement)
+            return compiled(frame)
+
+        return traced
+
+    def __statement(self, statement):
+        kind = statement.elem_type
+        if kind == InterpreterBase.FCALL_DEF:
+            return self.__call_statement(statement)
+        if kind == "=":
+            return self.__assign(statement)
+        if kind == InterpreterBase.IF_DEF:
+            return self.__if(statement)
+        if kind == InterpreterBase.WHILE_DEF:
+            return self.__while(statement)
+        if kind == InterpreterBase.RETURN_DEF:
+            if statement.get("expression") is None:
+                nil = create_value(InterpreterBase.NIL_DEF)
+                return lambda frame: nil
+            return self.__return(statement)
+
+        # other expression statements are not executed by the interpreter
+        def no_op(frame):
+            return None
+
+        return no_op
+
+    def __call_statement(self, statement):
+        call = self.__expr(statement)
+        pos = statement.pos
+        locate_error = self.interpreter._locate_error
+
+        def call_statement(frame):
+            try:
+                call(frame)
+            except Exception as error:
+                locate_error(error, pos)
+                raise
+
+        return call_statement
+
+    def __return(self, statement):
+        if statement.get("expression").elem_type == InterpreterBase.FCALL_DEF:
+            return self.__tail_call(statement)
+        expr = self.__expr(statement.get("expression"))
+        nil = create_value(InterpreterBase.NIL_DEF)
+        pos = statement.pos
+        locate_error = self.interpreter._locate_error
+
+        def return_value(frame):
+            try:
+                value = expr(frame)
+            except Exception as error:
+                locate_error(error, pos)
+                raise
+            return nil if value is None else value
+
+        return return_value
+
+    def __tail_call(self, statement):
+        expr = statement.get("expression")
+        args = tuple(self.__expr(arg) for arg in expr.get("args"))
+        tail_call = self.interpreter._tail_call
+        pos = statement.pos
+        locate_error = self.interpreter._locate_error
+
+        def return_call(frame):
+            try:
+                return tail_call(expr, [arg(frame) for arg in args])
+            except Exception as error:
+                locate_error(error, pos)
+                raise
+
+        return return_call
+
+    def __assign(self, statement):
+        slot = statement.slot
+        expr = self.__expr(statement.get("expression"))
+        pos = statement.pos
+        locate_error = self.interpreter._locate_error
+
+        def assign(frame):
+            try:
+                frame[slot] = expr(frame)
+            except Exception as error:
+                locate_error(error, pos)
+                raise
+
+        return assign
+
+    def __if(self, statement):
+        condition = self.__expr(statement.get("condition"))
+        then_block = self.__block(statement.get("statements"))
+        check_condition = self.interpreter._check_condition
+        pos = statement.pos
+        locate_error = self.interpreter._locate_error
+        if statement.get("else_statements") is None:
+
+            def if_then(frame):
+                try:
+                    if check_condition(condition(frame)):
+                        return then_block(frame)
+                except Exception as error:
+                    locate_error(error, pos)
+                    raise
+                return None
+
+            return if_then
+
+        else_block = self.__block(statement.get("else_statements"))
+
+        def if_then_else(frame):
+            try:
+                if check_condition(condition(frame)):
+                    return then_block(frame)
+                return else_block(frame)
+            except Exception as error:
+                locate_error(error, pos)
+                raise
+
+        return if_then_else
+
+    def __while(self, statement):
+        condition = self.__expr(statement.get("condition"))
+        body = self.__block(statement.get("statements"))
+        check_condition = self.interpreter._check_condition
+        pos = statement.pos
+        locate_error = self.interpreter._locate_error
+
+        def while_loop(frame):
+            try:
+                while check_condition(condition(frame)):
+                    result = body(frame)
+                    if result is not None:
+                        return result
+            except Exception as error:
+                locate_error(error, pos)
+                raise
+            return None
+
+        return while_loop
+
+    def __expr(self, expr):
+        kind = expr.elem_type
+        if kind == InterpreterBase.INT_DEF:
+            return self.__const(Value(Type.INT, expr.get("val")))
+        if kind == InterpreterBase.STRING_DEF:
+            return self.__const(Value(Type.STRING, expr.get("val")))
+        if kind == InterpreterBase.BOOL_DEF:
+            return self.__const(Value(Type.BOOL, expr.get("val")))
+        if kind == InterpreterBase.NIL_DEF:
+            return self.__const(create_value(InterpreterBase.NIL_DEF))
+        if kind == InterpreterBase.VAR_DEF:
+            return self.__var(expr)
+        if kind == InterpreterBase.FCALL_DEF:
+            return self.__call(expr)
+        if kind == InterpreterBase.NEG_DEF or kind == InterpreterBase.NOT_DEF:
+            return self.__unary_op(expr)
+        if kind in self.interpreter.BIN_OPS:
+            return self.__binary_op(expr)
+        # lambdas, objects and method calls evaluate to None, as in the
+        # tree-walking interpreter
+        return self.__const(None)
+
+    def __const(self, value):
+        def const(frame):
+            return value
+
+        return const
+
+    def __var(self, expr):
+        name = expr.get("name")
+        slot = expr.slot
+        name_error = self.interpreter._name_error
+
+        def var(frame):
+            value = frame[slot]
+            if value is None:
+                name_error(name)
+            return value
+
+        return var
+
+    def __call(self, expr):
+        args = tuple(self.__expr(arg) for arg in expr.get("args"))
+        call = self.interpreter._call
+        if len(args) == 0:
+            return lambda frame: call(expr, [])
+        if len(args) == 1:
+            (arg0,) = args
+            return lambda frame: call(expr, [arg0(frame)])
+        if len(args) == 2:
+            arg0, arg1 = args
+            return lambda frame: call(expr, [arg0(frame), arg1(frame)])
+        return lambda frame: call(expr, [arg(frame) for arg in args])
+
+    def __unary_op(self, expr):
+        op = expr.elem_type
+        op1 = self.__expr(expr.get("op1"))
+        int_op = expr.int_op
+        if int_op is not None:  # operand proven INT
+            return lambda frame: Value(Type.INT, int_op(op1(frame).v))
+        unary_op = self.interpreter._unary_op
+        return lambda frame: unary_op(op, op1(frame))
+
+    def __binary_op(self, expr):
+        op = expr.elem_type
+        op1 = self.__expr(expr.get("op1"))
+        op2 = self.__expr(expr.get("op2"))
+        int_op = expr.int_op
+        if int_op is not None:  # both operands proven INT
+            return lambda frame: Value(Type.INT, int_op(op1(frame).v, op2(frame).v))
+        binary_op = self.interpreter._binary_op
+        return lambda frame: binary_op(op, op1(frame), op2(frame))
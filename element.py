@@ -1,19 +1,86 @@
+from intbase import InterpreterBase
+from type_valuev1 import Type
+
+# Dense integer tag for every kind of node, stored on each Element as .kind so
+# the interpreter can dispatch through a list instead of comparing elem_type
+# strings. Nodes of any other kind get UNKNOWN_KIND.
+BINARY_OPS = ("+", "-", "*", "/", "==", "<", "<=", ">", ">=", "!=", "||", "&&")
+KINDS = (
+    InterpreterBase.PROGRAM_DEF,
+    InterpreterBase.FUNC_DEF,
+    InterpreterBase.LAMBDA_DEF,
+    InterpreterBase.ARG_DEF,
+    InterpreterBase.REFARG_DEF,
+    "=",
+    InterpreterBase.IF_DEF,
+    InterpreterBase.WHILE_DEF,
+    InterpreterBase.RETURN_DEF,
+    InterpreterBase.NEG_DEF,
+    InterpreterBase.NOT_DEF,
+    InterpreterBase.INT_DEF,
+    InterpreterBase.BOOL_DEF,
+    InterpreterBase.STRING_DEF,
+    InterpreterBase.NIL_DEF,
+    InterpreterBase.OBJ_DEF,
+    InterpreterBase.VAR_DEF,
+    InterpreterBase.FCALL_DEF,
+    InterpreterBase.MCALL_DEF,
+) + BINARY_OPS
+KIND = {elem_type: i for i, elem_type in enumerate(KINDS)}
+UNKNOWN_KIND = len(KINDS)
+NUM_KINDS = UNKNOWN_KIND + 1
+
+# elem_types of the kinds of node the passes and engines treat alike
+BINARY_OP_TYPES = frozenset(BINARY_OPS)
+UNARY_OP_TYPES = frozenset({InterpreterBase.NEG_DEF, InterpreterBase.NOT_DEF})
+BLOCK_TYPES = frozenset({InterpreterBase.IF_DEF, InterpreterBase.WHILE_DEF})
+# literal elem_type -> the Type of its value
+LITERAL_TYPES = {
+    InterpreterBase.INT_DEF: Type.INT,
+    InterpreterBase.STRING_DEF: Type.STRING,
+    InterpreterBase.BOOL_DEF: Type.BOOL,
+    InterpreterBase.NIL_DEF: Type.NIL,
+}
+
+
+# AST node. Element(elem_type, **fields) builds an instance of the subclass
+# for that kind of node, which stores its fields in __slots__ rather than a
+# per-node dict. Fields can be read directly (statement.condition) or, as
+# before, through get("condition"). elem_type stays the kind's string name.
+# pos is the lexpos of the token the node was parsed from, or None for nodes
+# made after parsing; the program's LineIndex turns it into a line.
 class Element:
-    def __init__(self, elem_type, **kwargs):
+    __slots__ = ("elem_type", "kind", "pos")
+    fields = ()
+
+    def __new__(cls, elem_type=None, **kwargs):
+        if cls is Element:
+            cls = _NODE_CLASSES.get(elem_type, _GenericElement)
+        return object.__new__(cls)
+
+    def __init__(self, elem_type, pos=None, **kwargs):
         self.elem_type = elem_type
-        self.dict = {}
-        for key, value in kwargs.items():
-            self.dict[key] = value
+        self.kind = KIND.get(elem_type, UNKNOWN_KIND)
+        self.pos = pos
+        for key in self.fields:
+            setattr(self, key, kwargs.pop(key, None))
+        if kwargs:
+            raise TypeError(f"Unknown fields for {elem_type} node: {list(kwargs)}")
 
     def get(self, key):
-        if key not in self.dict:
+        if key not in self.fields:
             return None
-        return self.dict[key]
+        return getattr(self, key)
+
+    # A dict of the node's fields; changes to it don't affect the node
+    @property
+    def dict(self):
+        return {key: getattr(self, key) for key in self.fields}
 
     def __str__(self):
         s = f"{self.elem_type}: "
-        for key, value in self.dict.items():
-            s += key + ": " + self.__val(value) + ", "
+        for key in self.fields:
+            s += key + ": " + self.__val(getattr(self, key)) + ", "
         return s[0:-2]
 
     def __val(self, v):
@@ -27,3 +94,173 @@ class Element:
                 return "[" + s[0:-2] + "]"
             return "[" + s + "]"
         return str(v)
+
+
+class ProgramElement(Element):
+    fields = ("functions",)
+    # lines is set by brewparse, call_sites (how many there are) by resolverv2
+    __slots__ = fields + ("lines", "call_sites")
+
+    def __init__(self, elem_type, **kwargs):
+        super().__init__(elem_type, **kwargs)
+        self.lines = None
+        self.call_sites = 0
+
+
+class FuncElement(Element):
+    fields = ("name", "args", "statements")
+    # set by resolverv2, and memov2 for pure
+    __slots__ = fields + ("frame_size", "slot_names", "pure")
+
+
+class LambdaElement(Element):
+    fields = ("args", "statements")
+    __slots__ = fields + ("frame_size", "slot_names")
+
+
+class ArgElement(Element):
+    fields = ("name",)
+    __slots__ = fields + ("slot",)
+
+
+class AssignElement(Element):
+    fields = ("name", "expression")
+    __slots__ = fields + ("depth", "slot")
+
+
+class IfElement(Element):
+    __slots__ = fields = ("condition", "statements", "else_statements")
+
+
+class WhileElement(Element):
+    __slots__ = fields = ("condition", "statements")
+
+
+class ReturnElement(Element):
+    __slots__ = fields = ("expression",)
+
+
+class UnaryOpElement(Element):
+    fields = ("op1",)
+    __slots__ = fields + ("int_op",)  # set by inferv2
+
+    def __init__(self, elem_type, **kwargs):
+        super().__init__(elem_type, **kwargs)
+        self.int_op = None
+
+
+class BinaryOpElement(Element):
+    fields = ("op1", "op2")
+    __slots__ = fields + ("int_op",)
+
+    def __init__(self, elem_type, **kwargs):
+        super().__init__(elem_type, **kwargs)
+        self.int_op = None
+
+
+class ValueElement(Element):
+    __slots__ = fields = ("val",)
+
+
+class EmptyElement(Element):
+    __slots__ = fields = ()
+
+
+class VarElement(Element):
+    fields = ("name",)
+    __slots__ = fields + ("depth", "slot")
+
+
+class FCallElement(Element):
+    fields = ("name", "args")
+    # number of the call in its program, set by resolverv2; each run keeps
+    # what the call resolved to under it, off the shared node
+    __slots__ = fields + ("site",)
+
+    def __init__(self, elem_type, **kwargs):
+        super().__init__(elem_type, **kwargs)
+        self.site = None
+
+
+class MCallElement(Element):
+    __slots__ = fields = ("objref", "name", "args")
+
+
+# Fallback for kinds of node not listed below; keeps whatever fields it was
+# built with in a per-node dict, like the original Element
+class _GenericElement(Element):
+    __slots__ = ("fields", "__dict__")
+
+    def __init__(self, elem_type, pos=None, **kwargs):
+        self.elem_type = elem_type
+        self.kind = KIND.get(elem_type, UNKNOWN_KIND)
+        self.pos = pos
+        self.fields = tuple(kwargs)
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+
+# Yields expr and every expression nested in it, each after the expressions
+# it contains. Uses an explicit stack rather than recursion, since generated
+# programs can nest expressions thousands deep. Lambda bodies aren't entered.
+def postorder(expr):
+    stack = [(expr, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if children_done:
+            yield node
+            continue
+        stack.append((node, True))
+        if node.elem_type in _CALL_TYPES:
+            children = node.args
+        elif node.elem_type in _OPERATOR_TYPES:
+            children = (node.op1,) if node.get("op2") is None else (node.op1, node.op2)
+        else:
+            continue
+        for child in reversed(children):
+            stack.append((child, False))
+
+
+# Yields statements and every statement nested in them, each before the
+# statements it contains, and then-branches before else-branches. Like
+# postorder, it keeps its own stack so deep nesting doesn't recurse.
+def all_statements(statements):
+    stack = [iter(statements)]
+    while stack:
+        statement = next(stack[-1], None)
+        if statement is None:
+            stack.pop()
+            continue
+        yield statement
+        if statement.elem_type in BLOCK_TYPES:
+            if statement.get("else_statements") is not None:
+                stack.append(iter(statement.else_statements))
+            stack.append(iter(statement.statements))
+
+
+_CALL_TYPES = {InterpreterBase.FCALL_DEF, InterpreterBase.MCALL_DEF}
+_OPERATOR_TYPES = BINARY_OP_TYPES | UNARY_OP_TYPES
+
+_NODE_CLASSES = {
+    InterpreterBase.PROGRAM_DEF: ProgramElement,
+    InterpreterBase.FUNC_DEF: FuncElement,
+    InterpreterBase.LAMBDA_DEF: LambdaElement,
+    InterpreterBase.ARG_DEF: ArgElement,
+    InterpreterBase.REFARG_DEF: ArgElement,
+    "=": AssignElement,
+    InterpreterBase.IF_DEF: IfElement,
+    InterpreterBase.WHILE_DEF: WhileElement,
+    InterpreterBase.RETURN_DEF: ReturnElement,
+    InterpreterBase.NEG_DEF: UnaryOpElement,
+    InterpreterBase.NOT_DEF: UnaryOpElement,
+    InterpreterBase.INT_DEF: ValueElement,
+    InterpreterBase.BOOL_DEF: ValueElement,
+    InterpreterBase.STRING_DEF: ValueElement,
+    InterpreterBase.NIL_DEF: EmptyElement,
+    InterpreterBase.OBJ_DEF: EmptyElement,
+    InterpreterBase.VAR_DEF: VarElement,
+    InterpreterBase.FCALL_DEF: FCallElement,
+    InterpreterBase.MCALL_DEF: MCallElement,
+}
+for op in BINARY_OPS:
+    _NODE_CLASSES[op] = BinaryOpElement
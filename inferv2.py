@@ -0,0 +1,110 @@
+# Static type inference over each function, run after resolverv2.
+#
+# A variable's type is the join of the types of everything assigned to it in
+# the function; parameters and anything a call returns could be of any type.
+# Types are found by iterating to a fixed point, since what a variable holds
+# can depend on other variables (or itself, as in i = i + 1).
+#
+# A binary operator or neg whose operands are both proven INT is marked by
+# setting its int_op to the function computing it on raw ints (from the
+# interpreter's int_ops), which the engines call without any type checks.
+# Every other operator keeps int_op None and goes through the checked path.
+# Whether a variable is bound at all is still checked where it's read.
+from element import BLOCK_TYPES, LITERAL_TYPES, all_statements, postorder
+from intbase import InterpreterBase
+from type_valuev1 import Type
+
+ANY = "any"  # not known until run time
+_ARITHMETIC = {"+", "-", "*", "/"}
+_COMPARISONS = {"==", "!=", "<", "<=", ">", ">="}
+
+
+def infer_program(ast, int_ops):
+    for func in ast.get("functions"):
+        TypeInference(int_ops).infer_function(func)
+
+
+class TypeInference:
+    def __init__(self, int_ops):
+        self.int_ops = int_ops
+
+    def infer_function(self, func):
+        # None means nothing has been assigned to the slot (yet)
+        self.slot_types = [None] * func.frame_size
+        for arg in func.get("args"):
+            self.slot_types[arg.slot] = ANY
+        assignments = [
+            statement
+            for statement in all_statements(func.get("statements"))
+            if statement.elem_type == "="
+        ]
+        changed = True
+        while changed:
+            changed = False
+            for assign in assignments:
+                t = self.__join(
+                    self.slot_types[assign.slot], self.__type(assign.expression)
+                )
+                if t != self.slot_types[assign.slot]:
+                    self.slot_types[assign.slot] = t
+                    changed = True
+        self.__mark_statements(func.get("statements"))
+
+    def __join(self, t1, t2):
+        if t1 is None:
+            return t2
+        if t2 is None or t1 == t2:
+            return t1
+        return ANY
+
+    # The type expr is proven to evaluate to, None if it can't produce a
+    # value yet, or ANY
+    def __type(self, expr):
+        return self.__types(expr)[id(expr)]
+
+    # The types of expr and every expression in it, keyed by node id
+    def __types(self, expr):
+        types = {}
+        for node in postorder(expr):
+            kind = node.elem_type
+            if kind in LITERAL_TYPES:
+                t = LITERAL_TYPES[kind]
+            elif kind == InterpreterBase.VAR_DEF:
+                t = self.slot_types[node.slot] if node.depth == 0 else ANY
+            elif kind in _ARITHMETIC or kind in _COMPARISONS:
+                t1 = types[id(node.op1)]
+                t2 = types[id(node.op2)]
+                if t1 is None or t2 is None:
+                    t = None
+                elif t1 == Type.INT and t2 == Type.INT:
+                    t = Type.INT  # comparisons of INTs are INT-typed too
+                else:
+                    t = ANY
+            elif kind == InterpreterBase.NEG_DEF:
+                t = types[id(node.op1)]
+            else:
+                t = ANY
+            types[id(node)] = t
+        return types
+
+    def __mark_statements(self, statements):
+        for statement in all_statements(statements):
+            kind = statement.elem_type
+            if kind == "=" or kind == InterpreterBase.RETURN_DEF:
+                if statement.expression is not None:
+                    self.__mark(statement.expression)
+            elif kind in BLOCK_TYPES:
+                self.__mark(statement.condition)
+            else:
+                self.__mark(statement)
+
+    def __mark(self, expr):
+        types = self.__types(expr)
+        for node in postorder(expr):
+            kind = node.elem_type
+            if kind in _ARITHMETIC or kind in _COMPARISONS:
+                if types[id(node.op1)] == Type.INT and types[id(node.op2)] == Type.INT:
+                    node.int_op = self.int_ops[kind]
+            elif kind == InterpreterBase.NEG_DEF:
+                if types[id(node.op1)] == Type.INT:
+                    node.int_op = self.int_ops[kind]
@@ -1,7 +1,65 @@
-from env_v1 import EnvironmentManager
+import functools
+import operator
+import sys
+import threading
+
+from element import BINARY_OP_TYPES, KIND, NUM_KINDS, UNARY_OP_TYPES, FuncElement
 from type_valuev1 import Type, Value, create_value, get_printable
 from intbase import InterpreterBase, ErrorType
 from brewparse import parse_program
+from optimizerv2 import fold_program
+from resolverv2 import resolve_program
+from inferv2 import infer_program
+from memov2 import MEMO_SIZE, MemoCache, mark_pure_functions
+from programcachev2 import PreparedProgram, ProgramCache, source_key
+from bytecodev2 import compile_program
+from vmv2 import VM
+from closurev2 import ClosureEngine
+from transpilev2 import PythonEngine, compile_python
+
+_INT = Type.INT
+_FCALL_KIND = KIND[InterpreterBase.FCALL_DEF]
+# Python frames allowed per Brewin call when sizing the recursion limit for
+# max_call_depth; the walkers use a handful per call plus one or two per
+# level of expression nesting
+_PYTHON_FRAMES_PER_CALL = 40
+
+
+# Raises the process-wide recursion limit while any run needs it raised. Runs
+# on other threads can overlap, so the limit is only put back to what it was
+# once the last of them is done.
+class _RecursionLimit:
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__users = 0
+        self.__saved = None
+
+    def acquire(self, limit):
+        with self.__lock:
+            if self.__users == 0:
+                self.__saved = sys.getrecursionlimit()
+            self.__users += 1
+            if limit > sys.getrecursionlimit():
+                sys.setrecursionlimit(limit)
+
+    def release(self):
+        with self.__lock:
+            self.__users -= 1
+            if self.__users == 0:
+                sys.setrecursionlimit(self.__saved)
+
+
+_recursion_limit = _RecursionLimit()
+
+
+# What a return of a call to a user function hands back to __call_new_func,
+# which runs func in place of the returning function rather than nesting it
+class TailCall:
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
 
 
 # Main interpreter class
@@ -10,93 +68,333 @@ class Interpreter(InterpreterBase):
     NIL_VALUE = create_value(InterpreterBase.NIL_DEF)
     TRUE_VALUE = create_value(InterpreterBase.TRUE_DEF)
     FALSE_VALUE = create_value(InterpreterBase.FALSE_DEF)
-    BIN_OPS = {"+", "-", "*", "/", "==", "<", "<=", ">", ">=", "!=", "||", "&&"}
+    BIN_OPS = BINARY_OP_TYPES
+    UNARY_OPS = UNARY_OP_TYPES
+    # "tree" walks the AST, "vm" compiles it to bytecode for vmv2.VM (which
+    # runs without recursing in Python), "closure" compiles it to nested
+    # Python closures with closurev2 and "python" transpiles it to Python
+    # source with transpilev2
+    ENGINES = ("tree", "vm", "closure", "python")
+    MAX_CALL_DEPTH = 1000
+    # prepared programs shared by every Interpreter in the process
+    program_cache = ProgramCache()
 
     # methods
-    def __init__(self, console_output=True, inp=None, trace_output=False):
+    def __init__(
+        self,
+        console_output=True,
+        inp=None,
+        trace_output=False,
+        engine="tree",
+        max_call_depth=MAX_CALL_DEPTH,
+        memoize=False,
+        memo_size=MEMO_SIZE,
+    ):
         super().__init__(console_output, inp)
+        if engine not in Interpreter.ENGINES:
+            raise ValueError(f"Unknown engine {engine}")
         self.trace_output = trace_output
+        self.engine = engine
+        self.max_call_depth = max_call_depth
+        # with memoize, calls to pure functions are cached in memo_size
+        # results per run
+        self.memoize = memoize
+        self.memo_size = memo_size
+        self.memo = None
+        self.__call_depth = 0
         self.__setup_ops()
-        self.overloadCount = 2
-        self.argNames = []
+        self.__setup_dispatch()
+        self.__frame = None
+        self.call_cache_hits = 0
+        self.call_cache_misses = 0
+        self.lines = None  # LineIndex of the program running
 
     # run a program that's provided in a string
     # usese the provided Parser found in brewparse.py to parse the program
     # into an abstract syntax tree (ast)
     def run(self, program):
+        try:
+            prepared = self.__prepare(program)
+        except RecursionError:
+            self._nesting_error()
+        ast = prepared.ast
+        self.lines = ast.lines
+        self.error_type = self.error_line = None
+        self.func_table = prepared.func_table
+        # what each call site of the program resolves to in this run
+        self.__call_targets = [None] * ast.call_sites
+        if self.memoize:
+            self.memo = MemoCache(self.memo_size)
+        main_func = self.__get_func_by_name("main", 0)
+
+        # the vm keeps Brewin calls on a stack of its own; in the other
+        # engines, calls other than tail calls recurse in Python, and so do
+        # the compilers of the closure and python engines
+        recurses = self.engine != "vm"
+        if recurses:
+            _recursion_limit.acquire(self.max_call_depth * _PYTHON_FRAMES_PER_CALL)
+        try:
+            self.__run(prepared, main_func)
+        except RecursionError:
+            # calls are stopped at max_call_depth before Python runs out of
+            # stack, so it's deeply nested code that did
+            self._nesting_error()
+        finally:
+            if recurses:
+                _recursion_limit.release()
+
+    def __run(self, prepared, main_func):
+        if self.engine == "vm":
+            codes = prepared.codes
+            if codes is None:
+                codes = compile_program(prepared.ast, self.trace_output)
+                codes = Interpreter.program_cache.add_codes(prepared, codes)
+            self.__run_func_body = VM(self, codes).run_function
+        elif self.engine == "closure":
+            self.__run_func_body = ClosureEngine(self, prepared.ast).run_function
+        elif self.engine == "python":
+            python = prepared.python
+            if python is None:
+                python = compile_python(prepared.ast, self.trace_output)
+                python = Interpreter.program_cache.add_python(prepared, python)
+            code, positions = python
+            if code is None:  # nested past CPython's limits
+                engine = ClosureEngine(self, prepared.ast)
+            else:
+                engine = PythonEngine(self, prepared.ast, code, positions)
+            self.__run_func_body = engine.run_function
+        else:
+            self.__run_func_body = self.__run_func_statements
+        self.__call_new_func(main_func, [])
+
+    # Parses program and runs every pass over it, or returns what that gave
+    # for the same source last time. The result is shared, so nothing may
+    # change it once it's been prepared.
+    def __prepare(self, program):
+        key = source_key(program, self.trace_output)
+        prepared = Interpreter.program_cache.get(key)
+        if prepared is not None:
+            return prepared
         ast = parse_program(program)
-        self.__set_up_function_table(ast)
-        main_func = self.__get_func_by_name("main")
-        self.env = EnvironmentManager()
-        self.__run_statements(main_func.get("statements"))
+        if not self.trace_output:  # traces show the statements as written
+            fold_program(ast, self)
+        resolve_program(ast)
+        infer_program(ast, self.int_ops)
+        mark_pure_functions(ast)
+        prepared = PreparedProgram(key, ast, self.__function_table(ast))
+        Interpreter.program_cache.put(key, prepared)
+        return prepared
 
-    def __set_up_function_table(self, ast):
-        self.func_name_to_ast = {}
+    # Functions are overloaded by arity, so they're keyed by (name, arity);
+    # a later definition with the same name and arity replaces an earlier one
+    def __function_table(self, ast):
+        func_table = {}
         for func_def in ast.get("functions"):
-            if func_def.get("name") not in self.func_name_to_ast:
-                self.func_name_to_ast[func_def.get("name")] = func_def
-            else:  # Handle overloaded funcs
-                self.func_name_to_ast[
-                    func_def.get("name") + str(self.overloadCount)
-                ] = func_def
-                self.overloadCount += 1
-
-    def __get_func_by_name(self, name):
-        if name not in self.func_name_to_ast:
+            key = (func_def.get("name"), len(func_def.get("args")))
+            func_table[key] = func_def
+        return func_table
+
+    def __get_func_by_name(self, name, arity):
+        func = self.func_table.get((name, arity))
+        if func is None:
             super().error(ErrorType.NAME_ERROR, f"Function {name} not found")
-        return self.func_name_to_ast[name]
+        return func
+
+    # Counters describing how the last runs went
+    def get_profile(self):
+        return {
+            "call_cache_hits": self.call_cache_hits,
+            "call_cache_misses": self.call_cache_misses,
+            "memo": self.memo.report() if self.memo is not None else {},
+            "program_cache_hits": Interpreter.program_cache.hits,
+            "program_cache_misses": Interpreter.program_cache.misses,
+        }
+
+    # Runs func's statements with frame holding its variables
+    def __run_func_statements(self, func, frame):
+        caller_frame = self.__frame
+        self.__frame = frame
+        try:
+            return self.__run_statements(func.statements)
+        finally:
+            self.__frame = caller_frame
+
+    # Builds the tables that map a node's kind to the method that runs it
+    def __setup_dispatch(self):
+        self.__statement_table = [self.__run_nothing] * NUM_KINDS
+        self.__statement_table[KIND[InterpreterBase.FCALL_DEF]] = self.__run_fcall
+        self.__statement_table[KIND["="]] = self.__assign
+        self.__statement_table[KIND[InterpreterBase.IF_DEF]] = self.__run_if
+        self.__statement_table[KIND[InterpreterBase.WHILE_DEF]] = self.__run_while
+        self.__statement_table[KIND[InterpreterBase.RETURN_DEF]] = self.__run_return
 
+        self.__expr_table = [self.__eval_unsupported] * NUM_KINDS
+        self.__expr_table[KIND[InterpreterBase.INT_DEF]] = self.__eval_int
+        self.__expr_table[KIND[InterpreterBase.STRING_DEF]] = self.__eval_string
+        self.__expr_table[KIND[InterpreterBase.BOOL_DEF]] = self.__eval_bool
+        self.__expr_table[KIND[InterpreterBase.NIL_DEF]] = self.__eval_nil
+        self.__expr_table[KIND[InterpreterBase.VAR_DEF]] = self.__eval_var
+        self.__expr_table[KIND[InterpreterBase.FCALL_DEF]] = self.__call_func
+        for op in Interpreter.BIN_OPS:
+            self.__expr_table[KIND[op]] = self.__eval_binary_op
+        for op in Interpreter.UNARY_OPS:
+            self.__expr_table[KIND[op]] = self.__eval_unary_op
+
+    # Runs the statements in order. Returns the Value of the return statement
+    # that ended them, or None if control fell off the end.
     def __run_statements(self, statements):
-        # all statements of a function are held in arg3 of the function AST node
-        for statement in statements:
-            if self.trace_output:
-                print(statement)
-            if statement.elem_type == InterpreterBase.FCALL_DEF:
-                self.__call_func(statement)
-            elif statement.elem_type == "=":
-                self.__assign(statement)
-            elif statement.elem_type == InterpreterBase.IF_DEF:
-                ifVal = self.__eval_expr(statement.dict["condition"])
-                if (
-                    ifVal.type() != Type.BOOL
-                    and ifVal.value() != True
-                    and ifVal.value() != False
-                ):
-                    super().error(
-                        ErrorType.TYPE_ERROR, f"Invalid conditional statement"
-                    )
-                if ifVal.value():
-                    return self.__run_statements(statement.dict["statements"])
-                else:
-                    return self.__run_statements(statement.dict["else_statements"])
-
-            elif statement.elem_type == InterpreterBase.WHILE_DEF:
-                while self.__eval_expr(statement.dict["condition"]).value():
-                    return self.__run_statements(statement.dict["statements"])
-            elif statement.elem_type == InterpreterBase.RETURN_DEF:
-                if statement.dict["expression"] == Interpreter.NIL_VALUE:
-                    return None
-                else:
-                    return self.__eval_expr(statement.dict["expression"])
+        statement_table = self.__statement_table
+        try:
+            for statement in statements:
+                if self.trace_output:
+                    print(statement)
+                result = statement_table[statement.kind](statement)
+                if result is not None:
+                    return result
+        except Exception as error:
+            self._locate_error(error, statement.pos)
+            raise
+        return None
 
-        return Interpreter.NIL_VALUE
+    # statements other than the ones below aren't executed
+    def __run_nothing(self, statement):
+        return None
+
+    def __run_fcall(self, statement):
+        self.__call_func(statement)
+
+    def __assign(self, assign_ast):
+        value_obj = self.__eval_expr(assign_ast.expression)
+        self.__frame[assign_ast.slot] = value_obj
+
+    def __run_if(self, statement):
+        if self._check_condition(self.__eval_expr(statement.condition)):
+            return self.__run_statements(statement.statements)
+        if statement.else_statements is not None:
+            return self.__run_statements(statement.else_statements)
+        return None
+
+    def __run_while(self, statement):
+        while self._check_condition(self.__eval_expr(statement.condition)):
+            result = self.__run_statements(statement.statements)
+            if result is not None:
+                return result
+        return None
+
+    def __run_return(self, statement):
+        expr = statement.expression
+        if expr is None:
+            return Interpreter.NIL_VALUE
+        if expr.kind == _FCALL_KIND:
+            return self._tail_call(expr, [self.__eval_expr(arg) for arg in expr.args])
+        result = self.__eval_expr(expr)
+        return Interpreter.NIL_VALUE if result is None else result
 
     def __call_func(self, call_node):
-        func_name = call_node.get("name")
+        args = [self.__eval_expr(arg) for arg in call_node.args]
+        return self._call(call_node, args)
+
+    def __eval_expr(self, expr_ast):
+        return self.__expr_table[expr_ast.kind](expr_ast)
+
+    # lambdas, objects and method calls aren't supported yet
+    def __eval_unsupported(self, expr_ast):
+        return None
+
+    def __eval_int(self, expr_ast):
+        return Value(Type.INT, expr_ast.val)
+
+    def __eval_string(self, expr_ast):
+        return Value(Type.STRING, expr_ast.val)
+
+    def __eval_bool(self, expr_ast):
+        return Value(Type.BOOL, expr_ast.val)
+
+    def __eval_nil(self, expr_ast):
+        return Interpreter.NIL_VALUE
+
+    def __eval_var(self, expr_ast):
+        val = self.__frame[expr_ast.slot]
+        if val is None:
+            self._name_error(expr_ast.name)
+        return val
+
+    def __eval_binary_op(self, expr_ast):
+        if expr_ast.int_op is not None:  # both operands proven INT
+            return Value(
+                _INT,
+                expr_ast.int_op(
+                    self.__eval_expr(expr_ast.op1).v, self.__eval_expr(expr_ast.op2).v
+                ),
+            )
+        return self._binary_op(
+            expr_ast.elem_type,
+            self.__eval_expr(expr_ast.op1),
+            self.__eval_expr(expr_ast.op2),
+        )
+
+    def __eval_unary_op(self, expr_ast):
+        if expr_ast.int_op is not None:
+            return Value(_INT, expr_ast.int_op(self.__eval_expr(expr_ast.op1).v))
+        return self._unary_op(expr_ast.elem_type, self.__eval_expr(expr_ast.op1))
+
+    # The methods below hold the language semantics that every engine shares;
+    # engines only differ in how they walk or compile the AST around them.
+
+    # Returns whether the condition of an if/while holds
+    def _check_condition(self, value):
+        if (
+            value.type() != Type.BOOL
+            and value.value() != True
+            and value.value() != False
+        ):
+            super().error(ErrorType.TYPE_ERROR, f"Invalid conditional statement")
+        return value.value()
+
+    # Raised when a variable is read before it has been assigned
+    def _name_error(self, var_name):
+        super().error(ErrorType.NAME_ERROR, f"Variable {var_name} not found")
+
+    # Calls the builtin or user function named by the call node call_ast with
+    # already-evaluated arguments
+    def _call(self, call_ast, args):
+        target = self._call_target(call_ast, len(args))
+        if target.__class__ is FuncElement:
+            return self.__call_new_func(target, args)
+        return target(args)
+
+    # Like _call, for a call that's being returned: a user function isn't run
+    # here but handed back as a TailCall
+    def _tail_call(self, call_ast, args):
+        target = self._call_target(call_ast, len(args))
+        if target.__class__ is FuncElement:
+            return TailCall(target, args)
+        return target(args)
+
+    # The user function or builtin handler call_ast calls, resolved once per
+    # run. Targets are kept by the run, not on the node: the AST is shared
+    # by every run of the program, and a builtin's handler is bound to this
+    # Interpreter.
+    def _call_target(self, call_ast, arity):
+        target = self.__call_targets[call_ast.site]
+        if target is not None:
+            self.call_cache_hits += 1
+            return target
+        self.call_cache_misses += 1
+        target = self.__resolve_call(call_ast.name, arity)
+        self.__call_targets[call_ast.site] = target
+        return target
+
+    def __resolve_call(self, func_name, arity):
         if func_name == "print":
-            return self.__call_print(call_node)
+            return self.__call_print
         if func_name == "inputi":
-            return self.__call_input(call_node)
-        else:
-            return self.__call_new_func(call_node)
+            return functools.partial(self.__call_input, func_name)
+        return self.__get_func_by_name(func_name, arity)
 
-        # add code here later to call other functions
-        super().error(ErrorType.NAME_ERROR, f"Function {func_name} not found")
-
-    def __call_print(self, call_ast):
+    def __call_print(self, args):
         output = ""
-        for arg in call_ast.dict["args"]:
-            result = self.__eval_expr(arg)  # result is a Value object
+        for result in args:  # result is a Value object
             if not isinstance(result, str):
                 output = output + get_printable(result)
             else:
@@ -106,123 +404,148 @@ class Interpreter(InterpreterBase):
         super().output(output)
         return Interpreter.NIL_VALUE
 
-    def __call_new_func(self, call_ast):
-        func = self.__get_func_by_name(call_ast.dict["name"])
-
-        for i, arg in enumerate(call_ast.dict["args"]):
-            self.env.set(
-                func.dict["args"][i].dict["name"], self.__eval_expr(arg)
-            )  # result is a Value
-            self.argNames.append(func.dict["args"][i].dict["name"])
-        for j in range(2, self.overloadCount):  # Repeat for overloaded funcs
-            func = self.__get_func_by_name(call_ast.dict["name"] + str(j))
-            for i, arg in enumerate(call_ast.dict["args"]):
-                self.env.set(func.dict["args"][i].dict["name"], self.__eval_expr(arg))
-                self.argNames.append(func.dict["args"][i].dict["name"])
-        self.__run_statements(func.dict["statements"])
-        for arg in self.argNames:
-            self.env.set(
-                arg, InterpreterBase.NIL_DEF
-            )  # result is a Value object a Value object
+    def __call_new_func(self, func, args):
+        memo_key = None
+        if self.memo is not None and func.pure:
+            memo_key = self.memo.key(func, args)
+            if memo_key is not None:
+                result = self.memo.get(memo_key)
+                if result is not None:
+                    return result
 
-        return Interpreter.NIL_VALUE
+        if self.__call_depth >= self.max_call_depth:
+            self._call_depth_error()
+        self.__call_depth += 1
+        try:
+            while True:
+                # the callee's variables live in a fresh frame that is simply
+                # dropped when it returns
+                frame = [None] * func.frame_size
+                for i, arg in enumerate(args):
+                    frame[func.args[i].slot] = arg  # arg is a Value
+                result = self.__run_func_body(func, frame)
+                if result.__class__ is not TailCall:
+                    break
+                func = result.func  # run the returned call in this one's place
+                args = result.args
+        finally:
+            self.__call_depth -= 1
+
+        if result is None:
+            result = Interpreter.NIL_VALUE
+        if memo_key is not None:
+            self.memo.store(memo_key, result)
+        return result
+
+    def _call_depth_error(self):
+        super().error(
+            ErrorType.FAULT_ERROR,
+            f"Maximum call depth of {self.max_call_depth} exceeded",
+        )
 
-    def __call_input(self, call_ast):
-        args = []
-        for arg in call_ast.dict["args"]:
-            args.append(arg)
-        if args is not None and len(args) == 1:
-            result = self.__eval_expr(args[0])
-            super().output(get_printable(result))
-        elif args is not None and len(args) > 1:
+    def _nesting_error(self):
+        super().error(
+            ErrorType.FAULT_ERROR,
+            f"Code nested too deeply for the {self.engine} engine",
+        )
+
+    # Adds the line of the statement at pos to error, raised from it, if it's
+    # an error from InterpreterBase.error that has no line yet. The engines
+    # call this only once something has been raised, so finding the line
+    # costs nothing while a program runs without errors.
+    def _locate_error(self, error, pos):
+        if pos is None or self.lines is None or self.error_line is not None:
+            return
+        prefix = str(self.error_type)
+        message = str(error)
+        if error.__class__ is not Exception or not message.startswith(prefix):
+            return
+        self.error_line = self.lines.line(pos)
+        error.args = (f"{prefix} on line {self.error_line}{message[len(prefix):]}",)
+
+    def __call_input(self, func_name, args):
+        if len(args) == 1:
+            super().output(get_printable(args[0]))
+        elif len(args) > 1:
             super().error(
                 ErrorType.NAME_ERROR, "No inputi() function that takes > 1 parameter"
             )
         inp = super().get_input()
-        if call_ast.get("name") == "inputi":
+        if func_name == "inputi":
             return Value(Type.INT, int(inp))
         # we can support inputs here later
 
-    def __assign(self, assign_ast):
-        var_name = assign_ast.get("name")
-        value_obj = self.__eval_expr(assign_ast.dict["expression"])
-        self.argNames.append(var_name)
-        self.env.set(var_name, value_obj)
+    def _unary_op(self, op, obj):
+        if isinstance(obj, Value):
+            if op == InterpreterBase.NEG_DEF and obj.type() == Type.INT:
+                return Value(Type.INT, -obj.value())
+            if op == InterpreterBase.NOT_DEF and obj.type() == Type.BOOL:
+                return Value(Type.BOOL, not obj.value())
+        super().error(
+            ErrorType.TYPE_ERROR,
+            f"Incompatible type for operation",
+        )
 
-    def __eval_expr(self, expr_ast):
-        if expr_ast.elem_type == InterpreterBase.INT_DEF:
-            return Value(Type.INT, expr_ast.get("val"))
-        if expr_ast.elem_type == InterpreterBase.STRING_DEF:
-            return Value(Type.STRING, expr_ast.get("val"))
-        if expr_ast.elem_type == InterpreterBase.BOOL_DEF:
-            return Value(Type.BOOL, expr_ast.get("val"))
-        if expr_ast.elem_type == InterpreterBase.VAR_DEF:
-            var_name = expr_ast.get("name")
-            val = self.env.get(var_name)
-            if val is None:
-                super().error(ErrorType.NAME_ERROR, f"Variable {var_name} not found")
-            return val
-        if expr_ast.elem_type == InterpreterBase.FCALL_DEF:
-            return self.__call_func(expr_ast)
-        if expr_ast.elem_type in Interpreter.BIN_OPS:
-            return self.__eval_op(expr_ast)
-
-    def __eval_op(self, arith_ast):
-        if arith_ast.elem_type == "neg":
-            try:
-                obj = self.__eval_expr(arith_ast.get("op1"))
-                return Value(obj.type(), -obj.value())
-            except:
-                super().error(
-                    ErrorType.TYPE_ERROR,
-                    f"Incompatible type for operation",
-                )
-        elif arith_ast.elem_type == "!":
-            try:
-                obj = self.__eval_expr(arith_ast.get("op1"))
-                return Value(obj.type(), not obj.value())
-            except:
+    def _binary_op(self, op, left_value_obj, right_value_obj):
+        # fast path for INT op INT: compute on the raw ints, Value() hands back
+        # the shared objects for small results and comparison results
+        try:
+            if left_value_obj.t is _INT and right_value_obj.t is _INT:
+                f = self.int_ops[op]
+                return Value(_INT, f(left_value_obj.v, right_value_obj.v))
+        except (AttributeError, KeyError):
+            pass  # not two Values, or not an INT operator: checked below
+
+        try:
+            left_value_obj == None
+            right_value_obj == None
+            left_value_obj.type() is "nil"
+            right_value_obj.type() is "nil"
+            left_value_obj.type() != right_value_obj.type()
+        except:
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Incompatible types for operation",
+            )
+        if (
+            left_value_obj.type() != "nil"
+            and right_value_obj.type() != "nil"
+            and left_value_obj.type() == right_value_obj.type()
+        ):
+            if op not in self.op_to_lambda[left_value_obj.type()]:
                 super().error(
                     ErrorType.TYPE_ERROR,
-                    f"Incompatible types for operation",
+                    f"Incompatible operator.",
                 )
+            f = self.op_to_lambda[left_value_obj.type()][op]
+            result = f(left_value_obj, right_value_obj)
+            if result == None:
+                super().error(ErrorType.TYPE_ERROR, f"Invalid comparison")
+
+            return result
         else:
-            left_value_obj = self.__eval_expr(arith_ast.get("op1"))
-            right_value_obj = self.__eval_expr(arith_ast.get("op2"))
-            try:
-                left_value_obj == None
-                right_value_obj == None
-                left_value_obj.type() is "nil"
-                right_value_obj.type() is "nil"
-                left_value_obj.type() != right_value_obj.type()
-            except:
-                super().error(
-                    ErrorType.TYPE_ERROR,
-                    f"Incompatible types for operation",
-                )
-            if (
-                left_value_obj.type() != "nil"
-                and right_value_obj.type() != "nil"
-                and left_value_obj.type() == right_value_obj.type()
-            ):
-                if arith_ast.elem_type not in self.op_to_lambda[left_value_obj.type()]:
-                    super().error(
-                        ErrorType.TYPE_ERROR,
-                        f"Incompatible operator.",
-                    )
-                f = self.op_to_lambda[left_value_obj.type()][arith_ast.elem_type]
-                result = f(left_value_obj, right_value_obj)
-                if result == None:
-                    super().error(ErrorType.TYPE_ERROR, f"Invalid comparison")
-
-                return f(left_value_obj, right_value_obj)
-            else:
-                super().error(
-                    ErrorType.TYPE_ERROR,
-                    f"Incompatible types for operation",
-                )
+            super().error(
+                ErrorType.TYPE_ERROR,
+                f"Incompatible types for operation",
+            )
 
     def __setup_ops(self):
+        # INT operators on raw Python ints, for the fast path in _binary_op;
+        # comparisons keep their INT type, as in op_to_lambda
+        self.int_ops = {
+            "+": operator.add,
+            "-": operator.sub,
+            "*": operator.mul,
+            "/": operator.floordiv,
+            "==": operator.eq,
+            "!=": operator.ne,
+            "<": operator.lt,
+            "<=": operator.le,
+            ">": operator.gt,
+            ">=": operator.ge,
+            InterpreterBase.NEG_DEF: operator.neg,
+        }
+
         self.op_to_lambda = {}
         # set up operations on integers
         self.op_to_lambda[Type.INT] = {}
@@ -0,0 +1,115 @@
+# Memoization of pure Brewin functions.
+#
+# mark_pure_functions sets func.pure on every function in the program. A
+# function is pure if its body has no lambdas or method calls, assigns only
+# to its own variables, and only calls functions that are themselves pure
+# (so never print or inputi, and never a function that doesn't exist).
+# Purity is found as a fixed point: every function starts out pure and loses
+# it once it calls one that isn't.
+#
+# MemoCache holds the results of calls to pure functions, keyed by the
+# function and its arguments, evicting the least recently used once it holds
+# max_size results. Only calls that return are cached; one that raises an
+# error raises it again every time.
+from collections import OrderedDict
+
+from element import BLOCK_TYPES, all_statements, postorder
+from intbase import InterpreterBase
+
+MEMO_SIZE = 4096
+_BUILTINS = {"print", "inputi"}
+
+
+def mark_pure_functions(ast):
+    funcs = ast.get("functions")
+    table = {(func.get("name"), len(func.get("args"))): func for func in funcs}
+    callees = {}
+    for func in funcs:
+        func.pure, callees[func] = _local_effects(func.get("statements"), table)
+    changed = True
+    while changed:
+        changed = False
+        for func in funcs:
+            if func.pure and not all(callee.pure for callee in callees[func]):
+                func.pure = False
+                changed = True
+
+
+# Returns whether statements could be pure, going by what they do themselves,
+# and the functions they call
+def _local_effects(statements, table):
+    pure = True
+    callees = set()
+    for statement in all_statements(statements):
+        kind = statement.elem_type
+        if kind == "=":
+            pure = pure and statement.depth == 0
+        if kind == InterpreterBase.FCALL_DEF:
+            exprs = [statement]
+        elif kind in BLOCK_TYPES:
+            exprs = [statement.get("condition")]
+        elif kind == "=" or kind == InterpreterBase.RETURN_DEF:
+            exprs = [statement.get("expression")]
+        else:
+            exprs = []
+        for expr in exprs:
+            if expr is None:
+                continue
+            for node in postorder(expr):
+                if node.elem_type == InterpreterBase.FCALL_DEF:
+                    callee = table.get((node.get("name"), len(node.get("args"))))
+                    if callee is None or node.get("name") in _BUILTINS:
+                        pure = False
+                    else:
+                        callees.add(callee)
+                elif node.elem_type in (
+                    InterpreterBase.LAMBDA_DEF,
+                    InterpreterBase.MCALL_DEF,
+                ):
+                    pure = False
+    return pure, callees
+
+
+class MemoCache:
+    def __init__(self, max_size=MEMO_SIZE):
+        self.max_size = max_size
+        self.results = OrderedDict()  # (func, argument key) -> Value
+        self.stats = {}  # func -> [hits, misses]
+
+    # The key for a call to func with args, or None if the call can't be
+    # cached. It includes the class of each raw value, since e.g. an INT
+    # holding True doesn't behave like one holding 1.
+    def key(self, func, args):
+        if None in args:  # something that isn't a Value, like a lambda
+            return None
+        return func, tuple((arg.t, arg.v.__class__, arg.v) for arg in args)
+
+    # The cached result for key, or None (and a miss) if there isn't one
+    def get(self, key):
+        result = self.results.get(key)
+        stats = self.stats.get(key[0])
+        if stats is None:
+            stats = self.stats[key[0]] = [0, 0]
+        if result is None:
+            stats[1] += 1
+            return None
+        stats[0] += 1
+        self.results.move_to_end(key)
+        return result
+
+    def store(self, key, result):
+        self.results[key] = result
+        if len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+
+    # Hits, misses and hit rate for every function looked up, keyed by
+    # name/arity
+    def report(self):
+        report = {}
+        for func, (hits, misses) in self.stats.items():
+            report[f"{func.get('name')}/{len(func.get('args'))}"] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses),
+            }
+        return report
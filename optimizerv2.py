@@ -0,0 +1,155 @@
+# Constant folding and dead-branch elimination over the AST, run once after
+# parsing and before variables are resolved.
+#
+# An operator whose operands are all literals is evaluated with the
+# interpreter's own _binary_op/_unary_op and replaced by a literal holding the
+# result. Anything that raises (a TYPE_ERROR, division by zero, ...) is left
+# in place, so the error still happens at run time, with the same type, if and
+# when that code runs. An if whose condition is a literal is replaced by the
+# statements of the branch it takes, and a while whose condition is a literal
+# that's false is dropped.
+from element import (
+    BINARY_OP_TYPES,
+    BLOCK_TYPES,
+    LITERAL_TYPES,
+    UNARY_OP_TYPES,
+    Element,
+    all_statements,
+    postorder,
+)
+from intbase import InterpreterBase
+from type_valuev1 import Type, Value, create_value
+
+# node elem_type for a literal of each Value type
+_LITERAL_DEFS = {
+    Type.INT: InterpreterBase.INT_DEF,
+    Type.STRING: InterpreterBase.STRING_DEF,
+    Type.BOOL: InterpreterBase.BOOL_DEF,
+}
+
+
+def fold_program(ast, interpreter):
+    folder = ConstantFolder(interpreter)
+    for func in ast.get("functions"):
+        func.statements = folder.statements(func.get("statements"))
+
+
+class ConstantFolder:
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+
+    # Returns the folded list of statements
+    def statements(self, statements):
+        for statement in all_statements(statements):
+            self.__fold_expressions(statement)
+        return self.__prune(statements)
+
+    def __fold_expressions(self, statement):
+        kind = statement.elem_type
+        if kind == "=" or kind == InterpreterBase.RETURN_DEF:
+            if statement.expression is not None:
+                statement.expression = self.__expr(statement.expression)
+        elif kind == InterpreterBase.FCALL_DEF:
+            self.__expr(statement)
+        elif kind == InterpreterBase.IF_DEF or kind == InterpreterBase.WHILE_DEF:
+            statement.condition = self.__expr(statement.condition)
+
+    # Returns statements without the branches their folded conditions never
+    # take. Blocks are pruned innermost first, on the list all_statements
+    # gives rather than by recursion, so nesting depth doesn't matter.
+    def __prune(self, statements):
+        blocks = [s for s in all_statements(statements) if s.elem_type in BLOCK_TYPES]
+        for block in reversed(blocks):
+            block.statements = self.__pruned(block.statements)
+            if block.get("else_statements") is not None:
+                block.else_statements = self.__pruned(block.else_statements)
+        return self.__pruned(statements)
+
+    # statements, each replaced by what it prunes to; the blocks in them must
+    # have been pruned already
+    def __pruned(self, statements):
+        pruned = []
+        for statement in statements:
+            pruned.extend(self.__statement(statement))
+        return pruned
+
+    # Returns the statements that statement prunes to
+    def __statement(self, statement):
+        kind = statement.elem_type
+        if kind == InterpreterBase.IF_DEF:
+            taken = self.__constant_condition(statement.condition)
+            if taken is True:
+                return statement.statements
+            if taken is False:
+                return statement.else_statements or []
+        elif kind == InterpreterBase.WHILE_DEF:
+            if self.__constant_condition(statement.condition) is False:
+                return []
+        return [statement]
+
+    # Returns the folded expression, which is expr itself unless it became a
+    # literal
+    def __expr(self, expr):
+        folded = {}  # id of a node -> the literal it folded to
+        for node in postorder(expr):
+            kind = node.elem_type
+            if kind == InterpreterBase.FCALL_DEF:
+                node.args = [folded.get(id(arg), arg) for arg in node.args]
+                continue
+            if kind in BINARY_OP_TYPES:
+                node.op1 = folded.get(id(node.op1), node.op1)
+                node.op2 = folded.get(id(node.op2), node.op2)
+                left = self.__literal_value(node.op1)
+                right = self.__literal_value(node.op2)
+                if left is None or right is None:
+                    continue
+                op = self.interpreter._binary_op
+                result = self.__evaluate(op, kind, left, right)
+            elif kind in UNARY_OP_TYPES:
+                node.op1 = folded.get(id(node.op1), node.op1)
+                operand = self.__literal_value(node.op1)
+                if operand is None:
+                    continue
+                result = self.__evaluate(self.interpreter._unary_op, kind, operand)
+            else:
+                continue
+            literal = self.__literal(result, node.pos)
+            if literal is not None:
+                folded[id(node)] = literal
+        return folded.get(id(expr), expr)
+
+    # The Value of a literal node, or None if expr isn't a literal
+    def __literal_value(self, expr):
+        if expr.elem_type == InterpreterBase.NIL_DEF:
+            return create_value(InterpreterBase.NIL_DEF)
+        if expr.elem_type in LITERAL_TYPES:
+            return Value(LITERAL_TYPES[expr.elem_type], expr.val)
+        return None
+
+    # A literal node evaluating to value, at pos, or None if there's no such
+    # node
+    def __literal(self, value, pos):
+        if not isinstance(value, Value) or value.t not in _LITERAL_DEFS:
+            return None
+        return Element(_LITERAL_DEFS[value.t], val=value.v, pos=pos)
+
+    # True or False if condition is a literal that selects a branch, None if
+    # it isn't known until run time
+    def __constant_condition(self, condition):
+        value = self.__literal_value(condition)
+        if value is None:
+            return None
+        taken = self.__evaluate(self.interpreter._check_condition, value)
+        if taken is None:
+            return None
+        return bool(taken)
+
+    # Calls f, returning None instead of raising; the interpreter's error
+    # state is put back so only a run-time error is ever reported
+    def __evaluate(self, f, *args):
+        error = self.interpreter.get_error_type_and_line()
+        try:
+            return f(*args)
+        except Exception:
+            self.interpreter.error_type, self.interpreter.error_line = error
+            return None
@@ -0,0 +1,155 @@
+# In-process cache of prepared programs, keyed by a hash of the source.
+#
+# A PreparedProgram is everything Interpreter.run derives from the source
+# before running it: the AST after constant folding, resolution, type
+# inference and purity marking, the function table, and the bytecode or
+# Python code object once the vm or python engine has compiled it. Runs
+# that share one must treat it as immutable: anything a run works out for
+# itself, such as what each call resolves to, is kept by that run's
+# Interpreter, and compiled forms are only ever added, through add_codes and
+# add_python. The closure engine's closures aren't kept, since they're bound
+# to the Interpreter they were built for.
+#
+# The cache evicts the least recently used programs once the approximate
+# size of those it holds goes over max_bytes. A program's size covers its
+# AST and line index, and what the engines compile from it once they do.
+import hashlib
+import sys
+import threading
+import types
+from collections import OrderedDict
+
+from element import Element
+from type_valuev1 import Value
+
+PROGRAM_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class PreparedProgram:
+    def __init__(self, key, ast, func_table):
+        self.key = key  # source key it's cached under
+        self.ast = ast
+        self.func_table = func_table  # (name, arity) -> func Element
+        self.codes = None  # func Element -> Code, set by ProgramCache.add_codes
+        # (code object, lexpos of each line), set by ProgramCache.add_python
+        self.python = None
+        self.size = approximate_size(ast) + lines_size(ast.lines)
+
+
+# Roughly how many bytes the nodes of ast and everything they hold take
+def approximate_size(ast):
+    size = 0
+    seen = set()
+    stack = [ast]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, Element):
+            stack.extend(getattr(obj, key) for key in obj.fields)
+        elif isinstance(obj, list):
+            stack.extend(obj)
+    return size
+
+
+# Roughly how many bytes a LineIndex takes
+def lines_size(lines):
+    if lines is None:
+        return 0
+    return sys.getsizeof(lines) + sys.getsizeof(lines.starts)
+
+
+# Roughly how many bytes the Code objects in codes take, besides the nodes
+# they refer to, which are counted with the AST
+def codes_size(codes):
+    size = sys.getsizeof(codes)
+    for code in codes.values():
+        size += sys.getsizeof(code) + sys.getsizeof(vars(code))
+        for table in (code.ops, code.args, code.consts, code.calls, code.positions):
+            size += sys.getsizeof(table)
+        size += sum(sys.getsizeof(c) for c in code.consts if isinstance(c, Value))
+        size += sum(sys.getsizeof(call) for call in code.calls)
+    return size
+
+
+# Roughly how many bytes a code object from compile_python and the line
+# positions kept with it take, counting the code of the functions it defines
+def python_size(python):
+    code, positions = python
+    if code is None:
+        return 0
+    size = sys.getsizeof(positions)
+    stack = [code]
+    while stack:
+        code = stack.pop()
+        size += sys.getsizeof(code) + sys.getsizeof(code.co_code)
+        size += sys.getsizeof(code.co_consts) + sys.getsizeof(code.co_linetable)
+        stack.extend(c for c in code.co_consts if isinstance(c, types.CodeType))
+    return size
+
+
+def source_key(program, trace_output):
+    return hashlib.sha256(program.encode("utf-8")).hexdigest(), trace_output
+
+
+class ProgramCache:
+    def __init__(self, max_bytes=PROGRAM_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.__programs = OrderedDict()  # source key -> PreparedProgram
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        with self.__lock:
+            prepared = self.__programs.get(key)
+            if prepared is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__programs.move_to_end(key)
+            return prepared
+
+    def put(self, key, prepared):
+        with self.__lock:
+            old = self.__programs.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            if prepared.size > self.max_bytes:
+                return  # would evict everything else and still not fit
+            self.__programs[key] = prepared
+            self.bytes += prepared.size
+            self.__evict()
+
+    # Stores the vm's bytecode for prepared, unless another run got there
+    # first, and counts it in the size of prepared and, if it's still
+    # cached, of the cache. Returns the bytecode prepared ends up with.
+    def add_codes(self, prepared, codes):
+        return self.__add(prepared, "codes", codes, codes_size)
+
+    # Like add_codes, for what compile_python gave for prepared
+    def add_python(self, prepared, python):
+        return self.__add(prepared, "python", python, python_size)
+
+    def __add(self, prepared, name, compiled, size_of):
+        size = size_of(compiled)
+        with self.__lock:
+            if getattr(prepared, name) is not None:
+                return getattr(prepared, name)
+            setattr(prepared, name, compiled)
+            prepared.size += size
+            if self.__programs.get(prepared.key) is prepared:
+                self.bytes += size
+                self.__evict()
+            return compiled
+
+    def __evict(self):
+        while self.bytes > self.max_bytes:
+            _, evicted = self.__programs.popitem(last=False)
+            self.bytes -= evicted.size
+
+    def __len__(self):
+        return len(self.__programs)
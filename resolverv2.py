@@ -0,0 +1,92 @@
+# Resolves every variable in a program to a (depth, slot) pair before it runs.
+#
+# Each function (and lambda) gets a frame: a list with one slot per variable
+# it takes as a parameter, assigns or reads. A variable that is read but never
+# assigned still gets a slot that simply stays unbound (None), so reading it
+# raises NAME_ERROR when, and only if, that read runs. depth counts the scopes
+# between a use and the frame that owns the variable; it is only ever
+# non-zero inside lambdas, which no engine executes yet.
+#
+# Results are stored on the nodes: func.frame_size and func.slot_names,
+# arg.slot, and depth/slot on variable reads and assignments. Every function
+# call is also numbered, in call.site, with the count in ast.call_sites, so
+# a run can keep what each call resolves to in a list of its own.
+from element import BLOCK_TYPES, all_statements, postorder
+from intbase import InterpreterBase
+
+class Scope:
+    def __init__(self, parent=None, calls=None):
+        self.parent = parent
+        # the call nodes numbered so far, shared by every scope of a program
+        self.calls = parent.calls if parent is not None else calls
+        self.names = []  # slot -> variable name
+        self.slots = {}  # variable name -> slot
+
+    def declare(self, name):
+        if name not in self.slots:
+            self.slots[name] = len(self.names)
+            self.names.append(name)
+        return self.slots[name]
+
+    # Returns (depth, slot) for name, declaring it in this scope if no
+    # enclosing scope has it
+    def resolve(self, name):
+        scope = self
+        depth = 0
+        while scope is not None:
+            if name in scope.slots:
+                return depth, scope.slots[name]
+            scope = scope.parent
+            depth += 1
+        return 0, self.declare(name)
+
+
+def resolve_program(ast):
+    calls = []
+    for func in ast.get("functions"):
+        _resolve_function(func, None, calls)
+    ast.call_sites = len(calls)
+
+
+def _resolve_function(func, parent_scope, calls=None):
+    scope = Scope(parent_scope, calls)
+    for arg in func.get("args"):
+        arg.slot = scope.declare(arg.get("name"))
+    # anything the body assigns belongs to this frame, wherever the
+    # assignment appears
+    _declare_assigned(scope, func.get("statements"))
+    _resolve_statements(scope, func.get("statements"))
+    func.frame_size = len(scope.names)
+    func.slot_names = tuple(scope.names)
+
+
+def _declare_assigned(scope, statements):
+    for statement in all_statements(statements):
+        if statement.elem_type == "=":
+            scope.declare(statement.get("name"))
+
+
+def _resolve_statements(scope, statements):
+    for statement in all_statements(statements):
+        kind = statement.elem_type
+        if kind == "=":
+            statement.depth, statement.slot = scope.resolve(statement.get("name"))
+            _resolve_expr(scope, statement.get("expression"))
+        elif kind in BLOCK_TYPES:
+            _resolve_expr(scope, statement.get("condition"))
+        elif kind == InterpreterBase.RETURN_DEF:
+            if statement.get("expression") is not None:
+                _resolve_expr(scope, statement.get("expression"))
+        else:
+            _resolve_expr(scope, statement)
+
+
+def _resolve_expr(scope, expr):
+    for node in postorder(expr):
+        if node.elem_type == InterpreterBase.VAR_DEF:
+            node.depth, node.slot = scope.resolve(node.get("name"))
+        elif node.elem_type == InterpreterBase.FCALL_DEF:
+            node.site = len(scope.calls)
+            scope.calls.append(node)
+        elif node.elem_type == InterpreterBase.LAMBDA_DEF:
+            _resolve_function(node, scope)
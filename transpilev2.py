@@ -0,0 +1,278 @@
+# Transpiling engine: turns a Brewin program into Python source, compiles it
+# with compile() and lets CPython's own bytecode interpreter run it.
+#
+# Every Brewin function becomes a Python function taking its frame, which it
+# unpacks into one local per slot resolverv2 assigned (s0, s1, ...), so
+# Brewin variables are plain Python locals. Expressions
+# are flattened into temporaries in evaluation order, which keeps side
+# effects in the same order as the tree walker and keeps deeply nested
+# expressions clear of CPython's parser nesting limits. Operators and calls
+# go through the shared Interpreter methods, so type
+# checks still raise through InterpreterBase.error with the same ErrorType.
+#
+# The code object is kept with the rest of the prepared program in the
+# ProgramCache, along with the lexpos of the statement each generated line
+# belongs to, which is how an error raised by generated code is given its
+# line.
+#
+# CPython refuses code nested past its own limits (20 loops, 100 levels of
+# indentation), which Brewin doesn't have; for such programs compile_python
+# gives no code object and Interpreter runs them with the closure engine
+# instead.
+from element import BINARY_OP_TYPES, BLOCK_TYPES, UNARY_OP_TYPES, all_statements
+from intbase import InterpreterBase
+from type_valuev1 import Type, Value, create_value
+
+# Python source for operators inferv2 proved to have INT operands
+_INT_OPS = {
+    "+": "+",
+    "-": "-",
+    "*": "*",
+    "/": "//",
+    "==": "==",
+    "!=": "!=",
+    "<": "<",
+    "<=": "<=",
+    ">": ">",
+    ">=": ">=",
+}
+_FILENAME = "<brewin>"
+
+
+# The statements of every function in the order the generator numbers them
+# for trace output
+def _trace_statements(ast):
+    statements = []
+    for func in ast.get("functions"):
+        statements.extend(all_statements(func.get("statements")))
+    return statements
+
+
+# The function call nodes in an expression the generator compiles, outermost
+# call first. Walks an explicit stack: each level of a recursive generator
+# costs C stack, which runs out on expressions thousands deep before the
+# raised recursion limit is reached.
+def _expr_calls(expr):
+    stack = [expr]
+    while stack:
+        expr = stack.pop()
+        if expr is None:
+            continue
+        kind = expr.elem_type
+        if kind == InterpreterBase.FCALL_DEF:
+            yield expr
+            stack.extend(reversed(expr.get("args")))
+        elif kind in BINARY_OP_TYPES or kind in UNARY_OP_TYPES:
+            stack.append(expr.get("op2"))
+            stack.append(expr.get("op1"))
+
+
+# Every call node the generated code passes to call(), numbered the same way
+# for every parse of the same source so cached code can be reused
+def _call_sites(ast):
+    calls = []
+    for statement in _trace_statements(ast):
+        kind = statement.elem_type
+        if kind == InterpreterBase.FCALL_DEF:
+            calls.extend(_expr_calls(statement))
+        elif kind in BLOCK_TYPES:
+            calls.extend(_expr_calls(statement.get("condition")))
+        elif kind == "=" or kind == InterpreterBase.RETURN_DEF:
+            calls.extend(_expr_calls(statement.get("expression")))
+    return calls
+
+
+class PythonGenerator:
+    def __init__(self, trace_output=False):
+        self.trace_output = trace_output
+        self.consts = []
+        self.lines = []
+        self.positions = []  # lexpos of the statement each line belongs to
+        self.pos = None
+
+    # Returns the Python source for the whole program; function i of the
+    # program is defined as f_i. Afterwards, line_positions() maps its lines
+    # to statements.
+    def generate(self, ast):
+        self.trace_index = {
+            id(statement): i for i, statement in enumerate(_trace_statements(ast))
+        }
+        self.call_index = {id(call): i for i, call in enumerate(_call_sites(ast))}
+        for i, func in enumerate(ast.get("functions")):
+            self.temp_count = 0
+            self.pos = None
+            self.__emit(0, f"def f_{i}(frame):")
+            if func.frame_size:
+                slots = ", ".join(f"s{j}" for j in range(func.frame_size))
+                self.__emit(1, f"[{slots}] = frame")
+            self.__statements(1, func.get("statements"))
+        return "\n".join(self.consts + self.lines) + "\n"
+
+    # lexpos of the statement behind each line of the generated source, in
+    # order, starting with line 1
+    def line_positions(self):
+        return [None] * len(self.consts) + self.positions
+
+    def __emit(self, indent, line):
+        self.lines.append("    " * indent + line)
+        self.positions.append(self.pos)
+
+    def __temp(self, indent, expr_source):
+        name = f"t{self.temp_count}"
+        self.temp_count += 1
+        self.__emit(indent, f"{name} = {expr_source}")
+        return name
+
+    def __const(self, value_source):
+        name = f"c{len(self.consts)}"
+        self.consts.append(f"{name} = {value_source}")
+        return name
+
+    def __statements(self, indent, statements):
+        if not statements:
+            # folding can empty a body or branch, and Python needs something
+            self.__emit(indent, "pass")
+        for statement in statements:
+            self.pos = statement.pos
+            if self.trace_output:
+                self.__emit(indent, f"print(T[{self.trace_index[id(statement)]}])")
+            self.__statement(indent, statement)
+
+    def __statement(self, indent, statement):
+        kind = statement.elem_type
+        if kind == InterpreterBase.FCALL_DEF:
+            self.__expr(indent, statement)
+        elif kind == "=":
+            value = self.__expr(indent, statement.get("expression"))
+            self.__emit(indent, f"s{statement.slot} = {value}")
+        elif kind == InterpreterBase.IF_DEF:
+            condition = self.__expr(indent, statement.get("condition"))
+            self.__emit(indent, f"if check({condition}):")
+            self.__statements(indent + 1, statement.get("statements"))
+            if statement.get("else_statements") is not None:
+                self.__emit(indent, "else:")
+                self.__statements(indent + 1, statement.get("else_statements"))
+        elif kind == InterpreterBase.WHILE_DEF:
+            self.__emit(indent, "while True:")
+            condition = self.__expr(indent + 1, statement.get("condition"))
+            self.__emit(indent + 1, f"if not check({condition}):")
+            self.__emit(indent + 2, "break")
+            self.__statements(indent + 1, statement.get("statements"))
+        elif kind == InterpreterBase.RETURN_DEF:
+            if statement.get("expression") is None:
+                self.__emit(indent, "return NIL")
+            elif statement.get("expression").elem_type == InterpreterBase.FCALL_DEF:
+                call = statement.get("expression")
+                args = [self.__expr(indent, arg) for arg in call.get("args")]
+                index = self.call_index[id(call)]
+                self.__emit(
+                    indent, f"return tail_call(C[{index}], [{', '.join(args)}])"
+                )
+            else:
+                value = self.__expr(indent, statement.get("expression"))
+                # returning something that evaluated to None returns nil
+                if value == "None":
+                    self.__emit(indent, "return NIL")
+                else:
+                    self.__emit(indent, f"return {value}")
+        else:
+            # other expression statements are not executed by the interpreter
+            self.__emit(indent, "pass")
+
+    # Emits the lines computing expr and returns the name holding its Value
+    def __expr(self, indent, expr):
+        kind = expr.elem_type
+        if kind == InterpreterBase.INT_DEF:
+            return self.__const(f"Value(INT, {expr.get('val')!r})")
+        if kind == InterpreterBase.STRING_DEF:
+            return self.__const(f"Value(STRING, {expr.get('val')!r})")
+        if kind == InterpreterBase.BOOL_DEF:
+            return self.__const(f"Value(BOOL, {expr.get('val')!r})")
+        if kind == InterpreterBase.NIL_DEF:
+            return "NIL"
+        if kind == InterpreterBase.VAR_DEF:
+            # locals can't change in the middle of an expression, so the slot
+            # itself can stand for the value once it's known to be bound
+            self.__emit(indent, f"if s{expr.slot} is None:")
+            self.__emit(indent + 1, f"name_error({expr.get('name')!r})")
+            return f"s{expr.slot}"
+        if kind == InterpreterBase.FCALL_DEF:
+            args = [self.__expr(indent, arg) for arg in expr.get("args")]
+            call = f"call(C[{self.call_index[id(expr)]}], [{', '.join(args)}])"
+            return self.__temp(indent, call)
+        if kind == InterpreterBase.NEG_DEF or kind == InterpreterBase.NOT_DEF:
+            op1 = self.__expr(indent, expr.get("op1"))
+            if expr.int_op is not None:
+                return self.__temp(indent, f"Value(INT, -{op1}.v)")
+            return self.__temp(indent, f"unary_op({kind!r}, {op1})")
+        if kind in BINARY_OP_TYPES:
+            op1 = self.__expr(indent, expr.get("op1"))
+            op2 = self.__expr(indent, expr.get("op2"))
+            if expr.int_op is not None:
+                int_expr = f"{op1}.v {_INT_OPS[kind]} {op2}.v"
+                return self.__temp(indent, f"Value(INT, {int_expr})")
+            return self.__temp(indent, f"binary_op({kind!r}, {op1}, {op2})")
+        # lambdas, objects and method calls evaluate to None, as in the
+        # tree-walking interpreter
+        return "None"
+
+
+# Returns the compiled code object for the program and the lexpos of each of
+# its lines, or (None, None) if the program is nested too deeply for CPython
+# to compile
+def compile_python(ast, trace_output=False):
+    generator = PythonGenerator(trace_output)
+    try:
+        code = compile(generator.generate(ast), _FILENAME, "exec")
+    except SyntaxError:  # generated code is only ever invalid this way
+        return None, None
+    return code, generator.line_positions()
+
+
+class PythonEngine:
+    # code and positions are what compile_python returned for the program
+    def __init__(self, interpreter, ast, code, positions):
+        namespace = {
+            "Value": Value,
+            "INT": Type.INT,
+            "STRING": Type.STRING,
+            "BOOL": Type.BOOL,
+            "NIL": create_value(InterpreterBase.NIL_DEF),
+            "name_error": interpreter._name_error,
+            "call": interpreter._call,
+            "tail_call": interpreter._tail_call,
+            "check": interpreter._check_condition,
+            "binary_op": interpreter._binary_op,
+            "unary_op": interpreter._unary_op,
+            "T": _trace_statements(ast) if interpreter.trace_output else [],
+            "C": _call_sites(ast),
+        }
+        exec(code, namespace)
+        self.positions = positions
+        self.interpreter = interpreter
+        self.functions = {
+            func: namespace[f"f_{i}"] for i, func in enumerate(ast.get("functions"))
+        }
+
+    # Runs the body of func with its variables in frame and returns the Value
+    # it returned (or None)
+    def run_function(self, func, frame):
+        try:
+            return self.functions[func](frame)
+        except Exception as error:
+            # an error from a deeper call has its line already; only the
+            # innermost call needs to walk the traceback
+            if self.interpreter.error_line is None:
+                self.interpreter._locate_error(error, self.__error_pos(error))
+            raise
+
+    # lexpos of the statement that raised error: the one behind the innermost
+    # line of generated code in its traceback
+    def __error_pos(self, error):
+        pos = None
+        tb = error.__traceback__
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == _FILENAME:
+                pos = self.positions[tb.tb_lineno - 1]
+            tb = tb.tb_next
+        return pos
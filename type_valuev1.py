@@ -10,11 +10,56 @@ class Type(Enum):
     NIL = 4
 
 
-# Represents a value, which has a type and its value
+# Interning limits: INT values in this range and STRING values up to this
+# length are shared rather than allocated on every evaluation
+SMALL_INT_MIN = -128
+SMALL_INT_MAX = 1024
+SHORT_STRING_LEN = 16
+STRING_CACHE_SIZE = 4096
+
+
+# Represents a value, which has a type and its value. Values are immutable, so
+# nil, true, false, small ints and short strings are each a single shared
+# object: Value(Type.INT, 3) returns the same object every time.
 class Value:
-    def __init__(self, type, value=None):
-        self.t = type
-        self.v = value
+    __slots__ = ("t", "v")
+
+    def __new__(cls, type, value=None):
+        if type is Type.INT:
+            if value.__class__ is int:
+                if SMALL_INT_MIN <= value <= SMALL_INT_MAX:
+                    return _small_ints[value - SMALL_INT_MIN]
+            elif value is True:  # comparison results carry their operand type
+                return _INT_TRUE
+            elif value is False:
+                return _INT_FALSE
+        elif type is Type.BOOL:
+            if value is True:
+                return TRUE_VALUE
+            if value is False:
+                return FALSE_VALUE
+        elif type is Type.STRING:
+            if value.__class__ is str and len(value) <= SHORT_STRING_LEN:
+                interned = _short_strings.get(value)
+                if interned is None:
+                    interned = _new_value(type, value)
+                    if len(_short_strings) < STRING_CACHE_SIZE:
+                        _short_strings[value] = interned
+                return interned
+            if value is True:
+                return _STRING_TRUE
+            if value is False:
+                return _STRING_FALSE
+        elif type is Type.NIL and value is None:
+            return NIL_VALUE
+        return _new_value(type, value)
+
+    # Shared Values must never change, or every holder of one would see it
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Value is immutable; can't set {name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"Value is immutable; can't delete {name}")
 
     def value(self):
         return self.v
@@ -22,18 +67,32 @@ class Value:
     def type(self):
         return self.t
 
-    def set(self, other):
-        self.t = other.t
-        self.v = other.v
+
+def _new_value(type, value):
+    obj = object.__new__(Value)
+    object.__setattr__(obj, "t", type)
+    object.__setattr__(obj, "v", value)
+    return obj
+
+
+NIL_VALUE = _new_value(Type.NIL, None)
+TRUE_VALUE = _new_value(Type.BOOL, True)
+FALSE_VALUE = _new_value(Type.BOOL, False)
+_INT_TRUE = _new_value(Type.INT, True)
+_INT_FALSE = _new_value(Type.INT, False)
+_STRING_TRUE = _new_value(Type.STRING, True)
+_STRING_FALSE = _new_value(Type.STRING, False)
+_small_ints = [_new_value(Type.INT, i) for i in range(SMALL_INT_MIN, SMALL_INT_MAX + 1)]
+_short_strings = {}
 
 
 def create_value(val):
     if val == InterpreterBase.TRUE_DEF:
-        return Value(Type.BOOL, True)
+        return TRUE_VALUE
     elif val == InterpreterBase.FALSE_DEF:
-        return Value(Type.BOOL, False)
+        return FALSE_VALUE
     elif val == InterpreterBase.NIL_DEF:
-        return Value(Type.NIL, None)
+        return NIL_VALUE
     elif isinstance(val, str):
         return Value(Type.STRING, val)
     elif isinstance(val, int):
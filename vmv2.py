@@ -0,0 +1,176 @@
+# Stack VM that runs the bytecode produced by bytecodev2.
+#
+# The VM only replaces the walk over statements and expressions; operators
+# and builtins go through the same Interpreter methods the tree-walking
+# engine uses, so the two engines behave identically. Variables live in the
+# frame of the function running, at the slots resolverv2 gave them.
+#
+# Nothing here recurses in Python: expressions are already flat bytecode, and
+# a call to a user function saves the caller's code, pc, stack and frame on
+# an explicit call stack and carries on in the callee, so Brewin recursion is
+# only bounded by the interpreter's max_call_depth.
+from bytecodev2 import (
+    LOAD_CONST,
+    LOAD_VAR,
+    STORE_VAR,
+    BINARY_OP,
+    UNARY_OP,
+    CALL,
+    POP,
+    JUMP,
+    JUMP_IF_FALSE,
+    RETURN,
+    TRACE,
+    INT_BINARY_OP,
+    INT_UNARY_OP,
+    TAIL_CALL,
+    OPERATORS,
+)
+from element import FuncElement
+from intbase import InterpreterBase
+from type_valuev1 import Type, Value, create_value
+
+_INT = Type.INT
+_NIL = create_value(InterpreterBase.NIL_DEF)
+
+
+class VM:
+    def __init__(self, interpreter, codes):
+        self.interpreter = interpreter
+        self.codes = codes  # func Element -> Code
+
+    # Runs the body of func with its variables in frame, along with every
+    # user function it calls, and returns the Value func returned
+    def run_function(self, func, frame):
+        codes = self.codes
+        code = codes[func]
+        ops = code.ops
+        args = code.args
+        consts = code.consts
+        names = code.names
+        calls = code.calls
+
+        interpreter = self.interpreter
+        binary_op = interpreter._binary_op
+        unary_op = interpreter._unary_op
+        check_condition = interpreter._check_condition
+        call_target = interpreter._call_target
+        memo = interpreter.memo
+        # func itself already counts as one call
+        max_callers = interpreter.max_call_depth - 1
+
+        # (code, pc, stack, frame) of every suspended caller, plus the memo
+        # key to store the result of the call it's waiting on under, if any
+        callers = []
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        pc = 0
+        try:
+            while True:
+                op = ops[pc]
+                arg = args[pc]
+                pc += 1
+                if op == LOAD_VAR:
+                    value = frame[arg]
+                    if value is None:
+                        interpreter._name_error(names[arg])
+                    push(value)
+                    continue
+                elif op == LOAD_CONST:
+                    push(consts[arg])
+                    continue
+                elif op == INT_BINARY_OP:
+                    right = pop()
+                    stack[-1] = Value(_INT, consts[arg](stack[-1].v, right.v))
+                    continue
+                elif op == BINARY_OP:
+                    right = pop()
+                    stack[-1] = binary_op(OPERATORS[arg], stack[-1], right)
+                    continue
+                elif op == JUMP_IF_FALSE:
+                    if not check_condition(pop()):
+                        pc = arg
+                    continue
+                elif op == STORE_VAR:
+                    frame[arg] = pop()
+                    continue
+                elif op == JUMP:
+                    pc = arg
+                    continue
+                elif op == CALL or op == TAIL_CALL:
+                    call_ast, argc = calls[arg]
+                    if argc:
+                        call_args = stack[-argc:]
+                        del stack[-argc:]
+                    else:
+                        call_args = []
+                    target = call_target(call_ast, argc)
+                    if target.__class__ is FuncElement:
+                        value = None
+                        memo_key = None
+                        if op == CALL and memo is not None and target.pure:
+                            memo_key = memo.key(target, call_args)
+                            if memo_key is not None:
+                                value = memo.get(memo_key)
+                        if value is None:
+                            if op == CALL:
+                                if len(callers) >= max_callers:
+                                    interpreter._call_depth_error()
+                                callers.append((code, pc, stack, frame, memo_key))
+                            # a tail call simply replaces the function that's
+                            # returning
+                            frame = [None] * target.frame_size
+                            for i, arg_value in enumerate(call_args):
+                                frame[target.args[i].slot] = arg_value
+                            code = codes[target]
+                            ops = code.ops
+                            args = code.args
+                            consts = code.consts
+                            names = code.names
+                            calls = code.calls
+                            stack = []
+                            push = stack.append
+                            pop = stack.pop
+                            pc = 0
+                            continue
+                    else:
+                        value = target(call_args)  # a builtin
+                    if op == CALL:
+                        push(value)
+                        continue
+                elif op == POP:
+                    pop()
+                    continue
+                elif op == UNARY_OP:
+                    stack[-1] = unary_op(OPERATORS[arg], stack[-1])
+                    continue
+                elif op == INT_UNARY_OP:
+                    stack[-1] = Value(_INT, consts[arg](stack[-1].v))
+                    continue
+                elif op == RETURN:
+                    value = pop()
+                elif op == TRACE:
+                    print(consts[arg])
+                    continue
+
+                # only returns get this far: hand value back to the caller
+                if value is None:
+                    value = _NIL
+                if not callers:
+                    return value
+                code, pc, stack, frame, memo_key = callers.pop()
+                if memo_key is not None:
+                    memo.store(memo_key, value)
+                ops = code.ops
+                args = code.args
+                consts = code.consts
+                names = code.names
+                calls = code.calls
+                push = stack.append
+                pop = stack.pop
+                push(value)
+        except Exception as error:
+            # pc has already moved past the instruction that raised
+            interpreter._locate_error(error, code.positions[pc - 1])
+            raise